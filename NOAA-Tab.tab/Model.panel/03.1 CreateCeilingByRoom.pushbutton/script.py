@@ -5,16 +5,21 @@ __doc__="""Select Room & Create Ceiling"""
 
 import sys
 import clr
-from Autodesk.Revit.DB import FilteredElementCollector, BuiltInCategory, SpatialElementBoundaryOptions, CurveArray, Transaction, FloorType, Floor, CurveLoop, Level, SpatialElement, CeilingType, Ceiling  
+from Autodesk.Revit.DB import FilteredElementCollector, BuiltInCategory, SpatialElementBoundaryOptions, CurveArray, Transaction, FloorType, Floor, CurveLoop, Level, SpatialElement, CeilingType, Ceiling, ElementId
 from Autodesk.Revit.DB.Architecture import Room
 from Autodesk.Revit.UI.Selection import ObjectType
 from pyrevit import forms, revit
+from noaa.boundaries import get_boundary_cache
+from noaa.ceilings import COVERED, CREATED, INVALID, CeilingFootprints, create_ceilings, mark_covered, plan_ceilings
 
 # Initialize document and application
 uidoc = __revit__.ActiveUIDocument
 doc = uidoc.Document
 app = doc.Application
 
+# CONTROLS
+REPLACE_EXISTING = False # Replace a ceiling already over the room instead of skipping the room
+
 def get_ceiling_types(doc):
     return FilteredElementCollector(doc).OfClass(CeilingType).ToElements()
 
@@ -36,21 +41,25 @@ def prompt_for_height_offset(room):
         except ValueError:
             forms.alert("Please enter a valid number.")  
 
-def create_ceiling_from_room(room, ceiling_type, offset_value, doc):
-    boundry_options = SpatialElementBoundaryOptions()
-    room_boundary = room.GetBoundarySegments(boundry_options)
-    if room_boundary:
-        curve_list = [boundary.GetCurve() for boundary in room_boundary[0]]
-        curve_loop = CurveLoop.Create(curve_list)
-        curve_loops = [curve_loop]
-        with Transaction(doc,'Create ceiling') as t:
-            t.Start()
-            Ceiling.Create(doc, curve_loops, ceiling_type.Id, room.Level.Id)
-
- #           room_zone = room.LookupParameter('Zone').AsString()
-#            new_ceiling.LookupParameter('Zone').Set(room_zone)
- #           new_ceiling.LookupParameter('Height Offset From Level').Set(offset_value)
-            t.Commit()
+def create_ceiling_from_room(room, ceiling_type, offset_value, doc, footprints, level_rooms=None):
+    """footprints: CeilingFootprints built once for the run; level_rooms: every room of the
+    room's level, so a ceiling shared with another room is never replaced."""
+    # Every boundary loop (outer first, holes after), from the boundaries cached for the run
+    boundary_cache = get_boundary_cache(doc)
+    jobs = plan_ceilings([room], boundary_cache, ceiling_type, offset_value)
+    # Ceilings already over the room, so a rerun does not stack a duplicate
+    mark_covered(jobs, footprints, boundary_cache, REPLACE_EXISTING, level_rooms)
+    job = jobs[0]
+    if job.status == INVALID:
+        print("No ceiling for room {}: {}".format(room.Id, job.detail))
+    elif job.status == COVERED:
+        print("Room {} already has a ceiling: {}".format(room.Id, job.detail))
+    else:
+        # Height offset, the room's Zone and its source room are written with the ceiling;
+        # a replaced ceiling is deleted only once the new one is in
+        create_ceilings(doc, jobs, name='Create ceiling')
+        if job.status != CREATED or job.detail:
+            print("{}: {} - {}".format(job.status.upper(), job.label, job.detail))
 
 def main():
     try:
@@ -61,7 +70,11 @@ def main():
         ceiling_type = pick_ceiling_type(doc)
         offset_value = prompt_for_height_offset(selected_room)
 
-        create_ceiling_from_room(selected_room, ceiling_type, offset_value, doc)
+        level_id = selected_room.LevelId.IntegerValue
+        footprints = CeilingFootprints(doc, [level_id])
+        level_rooms = [r for r in FilteredElementCollector(doc).OfCategory(BuiltInCategory.OST_Rooms).WhereElementIsNotElementType()
+                       if r.LevelId.IntegerValue == level_id]
+        create_ceiling_from_room(selected_room, ceiling_type, offset_value, doc, footprints, level_rooms)
 
     except Exception as e:
         print("Error:", str(e))
@@ -9,12 +9,24 @@ from Autodesk.Revit.DB import FilteredElementCollector, BuiltInCategory, Spatial
 from Autodesk.Revit.DB.Architecture import Room
 from Autodesk.Revit.UI.Selection import ObjectType, ISelectionFilter
 from pyrevit import forms, revit
+from noaa.boundaries import get_boundary_cache
+from noaa.ceiling_rules import CeilingRules
+from noaa.ceilings import (CEILINGS_PER_TRANSACTION, CeilingFootprints, apply_rules, create_ceilings, mark_covered,
+                           plan_ceilings, print_ceiling_report)
 
 # Initialize document and application
 uidoc = __revit__.ActiveUIDocument
 doc = uidoc.Document
 app = doc.Application
 
+# CONTROLS
+BATCH = True # Create the ceilings in chunked transactions (False: one transaction per room)
+REPLACE_EXISTING = False # Replace a ceiling already over a room instead of skipping the room
+
+# MODES
+SELECTED_ROOMS = "Selected rooms (one ceiling type and offset)"
+RULES_TABLE = "Whole building (rules table, CSV or JSON)"
+
 class RoomSelectionFilter(ISelectionFilter):
     """Filter to allow only room selection."""
     def AllowElement(self, element):
@@ -48,25 +60,44 @@ def prompt_for_height_offset(room):
         except ValueError:
             forms.alert("Please enter a valid number.")  
 
-def create_ceiling_from_room(room, ceiling_type, offset_value, doc):
-    boundry_options = SpatialElementBoundaryOptions()
-    room_boundary = room.GetBoundarySegments(boundry_options)
-    if room_boundary:
-        curve_list = [boundary.GetCurve() for boundary in room_boundary[0]]
-        curve_loop = CurveLoop.Create(curve_list)
-        curve_loops = [curve_loop]
-        with Transaction(doc,'Create ceiling') as t:
-            t.Start()
-            Ceiling.Create(doc, curve_loops, ceiling_type.Id, room.Level.Id)
-
- #           room_zone = room.LookupParameter('Zone').AsString()
-#            new_ceiling.LookupParameter('Zone').Set(room_zone)
- #           new_ceiling.LookupParameter('Height Offset From Level').Set(offset_value)
-            t.Commit()
+def select_levels(doc):
+    levels = sorted(FilteredElementCollector(doc).OfClass(Level), key=lambda l: l.Elevation)
+    selected_names = forms.SelectFromList.show([l.Name for l in levels], title='Select Levels', multiselect=True)
+    if not selected_names:
+        sys.exit(0)
+    return [l for l in levels if l.Name in selected_names]
+
+def rooms_on_levels(doc, level_ids):
+    return [r for r in FilteredElementCollector(doc).OfCategory(BuiltInCategory.OST_Rooms).WhereElementIsNotElementType()
+            if r.LevelId.IntegerValue in level_ids]
+
+def run_rules_table():
+    """Ceilings for every room on the selected levels, type / offset / parameters from a rules table."""
+    rules_path = forms.pick_file(files_filter='Rules table (*.csv;*.json)|*.csv;*.json', title='Select Ceiling Rules')
+    if not rules_path:
+        sys.exit(0)
+    rules = CeilingRules.load(rules_path)
+    level_ids = set(l.Id.IntegerValue for l in select_levels(doc))
+    rooms = rooms_on_levels(doc, level_ids)
+    print("Rules: {}, rooms on the selected levels: {}".format(len(rules), len(rooms)))
+
+    boundary_cache = get_boundary_cache(doc)
+    jobs = plan_ceilings(rooms, boundary_cache)
+    mark_covered(jobs, CeilingFootprints(doc, level_ids), boundary_cache, REPLACE_EXISTING)
+    apply_rules(jobs, rules, get_ceiling_types(doc))
+    elapsed = create_ceilings(doc, jobs, name=__title__)
+    print_ceiling_report(jobs, elapsed)
 
 def main():
     try:
-    # Let user select multiple rooms
+        mode = forms.CommandSwitchWindow.show([SELECTED_ROOMS, RULES_TABLE], message='Create ceilings for:')
+        if not mode:
+            sys.exit(0)
+        if mode == RULES_TABLE:
+            run_rules_table()
+            return
+
+        # Let user select multiple rooms
         room_refs = uidoc.Selection.PickObjects(ObjectType.Element, RoomSelectionFilter(), "Select rooms.")
         rooms = [doc.GetElement(ref.ElementId) for ref in room_refs]
 
@@ -77,9 +108,19 @@ def main():
         if rooms:
             offset_value = prompt_for_height_offset("all selected rooms")  # Assuming all rooms use the same offset
 
-        # Apply ceiling to each selected room
-        for room in rooms:
-            create_ceiling_from_room(room, ceiling_type, offset_value, doc)
+        # Existing ceilings are indexed once for the run, on the selected rooms' levels
+        level_ids = set(r.LevelId.IntegerValue for r in rooms)
+        footprints = CeilingFootprints(doc, level_ids)
+        # Every room of those levels, so a ceiling also over an unselected room is never replaced
+        level_rooms = rooms_on_levels(doc, level_ids)
+
+        # Every selected room is planned and checked for existing ceilings before anything is created,
+        # so a ceiling shared by several selected rooms is replaced once all of them got a new one
+        boundary_cache = get_boundary_cache(doc)
+        jobs = plan_ceilings(rooms, boundary_cache, ceiling_type, offset_value)
+        mark_covered(jobs, footprints, boundary_cache, REPLACE_EXISTING, level_rooms)
+        elapsed = create_ceilings(doc, jobs, chunk_size=CEILINGS_PER_TRANSACTION if BATCH else 1, name=__title__)
+        print_ceiling_report(jobs, elapsed)
 
     except Exception as e:
         print("Error:", str(e))
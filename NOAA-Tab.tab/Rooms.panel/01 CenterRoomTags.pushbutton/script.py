@@ -4,6 +4,8 @@ __version__ = "Version 1.0"
 __doc__ = """It centers tags to Rooms"""
 
 from Autodesk.Revit.DB import *
+from noaa.boundaries import get_boundary_cache
+from noaa.rooms import LABEL_PRECISION, MoveReport, RoomStates, deoverlapped_tags, room_label_point
 
 
 doc   = __revit__.ActiveUIDocument.Document
@@ -14,102 +16,38 @@ app   = __revit__.Application
 all_room_tags = FilteredElementCollector(doc, doc.ActiveView.Id)\
     .OfCategory(BuiltInCategory.OST_RoomTags).WhereElementIsNotElementType().ToElements()
 
-# CONTROLS
-step = 2 # INTERNAL UNITS IN FEET
-
+boundary_cache = get_boundary_cache(doc)
 
-def move_room_and_tag(tag, room, new_pt):
-    """Function to move both Room and Tag Locations, if they are not part of the group.
-    :param tag:     Room Tag
-    :param room:    Room
-    :param new_pt:  XYZ Point."""
-    if room.GroupId == ElementId(-1): #ElementId(-1) means None
-        room.Location.Point = new_pt
+# Leave out tags of unplaced, unenclosed and redundant rooms before any geometry work
+room_states = RoomStates(boundary_cache)
+all_room_tags = room_states.usable_tags(all_room_tags)
 
-    if tag.GroupId == ElementId(-1):
-        tag.Location.Point = new_pt
+# CONTROLS
+label_precision = LABEL_PRECISION # INTERNAL UNITS IN FEET, smaller is more exact but slower
+DEOVERLAP = False # Move overlapping tags to free spots inside their rooms after centring
+move_report = MoveReport()
 
 
 with Transaction(doc, __title__) as t:
     t.Start()
 
 
+    targets = dict((tag.Id.IntegerValue, room_label_point(tag.Room, boundary_cache, label_precision)) for tag in all_room_tags)
+    # Tags an earlier de-overlap run moved off their room's centre stay there, so reruns change nothing
+    settled = deoverlapped_tags(doc.ActiveView, all_room_tags, targets, boundary_cache) if DEOVERLAP else set()
+
     for tag in all_room_tags:
         # ROOM DATA
         room = tag.Room
-        room_bb = room.get_BoundingBox(doc.ActiveView)
-        room_center = (room_bb.Min + room_bb.Max) / 2
-
-        # MOVE TO CENTER (if possible)
-        if room.IsPointInRoom(room_center):
-            move_room_and_tag(tag, room, room_center)
-
-        # FIND ANOTHER LOCATION
-        else:
-            room_boundaries = room.GetBoundarySegments(SpatialElementBoundaryOptions())
-            room_segments   = room_boundaries[0]
-
-            # Get Longest Segment
-            length = 0
-            longest_curve = None
-
-            for seg in room_segments:
-                curve = seg.GetCurve()
-                if curve.Length > length:
-                    longest_curve = curve
-                    length = curve.Length
-
-            # Get middle point on Curve
-            pt_start = longest_curve.GetEndPoint(0)
-            pt_end   = longest_curve.GetEndPoint(1)
-            pt_mid   = (pt_start + pt_end) / 2
-
-            pt_up    = XYZ(pt_mid.X       , pt_mid.Y +step , pt_mid.Z)
-            pt_down  = XYZ(pt_mid.X       , pt_mid.Y -step , pt_mid.Z)
-            pt_right = XYZ(pt_mid.X +step , pt_mid.Y       , pt_mid.Z)
-            pt_left  = XYZ(pt_mid.X -step , pt_mid.Y       , pt_mid.Z)
 
-            # Move on X Axis
-            if not (room.IsPointInRoom(pt_up) and room.IsPointInRoom(pt_down)):
-                if room.IsPointInRoom(pt_up):
-                    move_room_and_tag(tag, room, pt_up)
+        # MOVE TO THE POLE OF INACCESSIBILITY (farthest point from the walls), unless already there
+        move_report.move(tag, room, targets[tag.Id.IntegerValue], move_tag=tag.Id.IntegerValue not in settled)
 
-                elif room.IsPointInRoom(pt_down):
-                    move_room_and_tag(tag, room, pt_down)
-
-
-            # Move on Y Axis
-            elif not(room.IsPointInRoom(pt_right) and room.IsPointInRoom(pt_left)):
-                if room.IsPointInRoom(pt_right):
-                    move_room_and_tag(tag, room, pt_right)
-
-                elif room.IsPointInRoom(pt_left):
-                    move_room_and_tag(tag, room, pt_left)
+    # OPTIONAL: NUDGE TAGS OFF EACH OTHER (extents are read after the moves above)
+    if DEOVERLAP:
+        doc.Regenerate()
+        move_report.separate(doc.ActiveView, all_room_tags, boundary_cache)
     t.Commit()
 
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
+print(move_report)
+print(room_states.summary())
@@ -3,10 +3,15 @@ __author__  = "Bogdan Popa"
 __version__ = "Version 1.0"
 __doc__ = """It tags rooms on every sheet and centers tags to Rooms"""
 
+import time
+
 from Autodesk.Revit.DB import *
 from Autodesk.Revit.DB import LinkElementId, Document, Transaction, ViewSheet
+from Autodesk.Revit.Exceptions import InvalidOperationException
 from pyrevit import forms
 from System import Guid
+from noaa.boundaries import get_boundary_cache
+from noaa.rooms import LABEL_PRECISION, MoveReport, RoomLabelPoints, RoomStates, deoverlapped_tags
 
 uiapp = __revit__
 uidoc = uiapp.ActiveUIDocument
@@ -23,9 +28,86 @@ def set_active_view(doc, view_id):
     # Make sure the view is not a sheet, because you can't set a sheet as an active view.
     view = doc.GetElement(view_id)
     if not isinstance(view, ViewSheet):
+        # Opening a view makes Revit load and redraw it, log every one of them
+        print("Opening view: {} ({})".format(view.Name, view_id))
+        opened_view_ids.append(view_id)
         uidoc.ActiveView = view
         # There might be a need to refresh the UI here, but usually setting the ActiveView
 
+def process_view(doc, view_id, room_tag_type):
+    """Tag and align rooms of one plan, purely through its view id when HEADLESS.
+    The view is only opened if the headless attempt fails because the view is not open
+    (NEEDS_ACTIVE_VIEW); any other error is raised to the caller."""
+    if not HEADLESS:
+        set_active_view(doc, view_id)
+    try:
+        tag_all_rooms(doc, view_id, room_tag_type)
+        align_tags(doc, view_id)
+    except NEEDS_ACTIVE_VIEW as e:
+        if not HEADLESS:
+            raise
+        print("Headless tagging needs view {} open: {}".format(view_id, e))
+        set_active_view(doc, view_id)
+        tag_all_rooms(doc, view_id, room_tag_type)
+        align_tags(doc, view_id)
+
+def process_views_batched(doc, view_ids, room_tag_type):
+    """Tag and align many plans under one TransactionGroup: all tags are created first
+    (create_room_tags), then tags are centred VIEWS_PER_TRANSACTION views per transaction.
+    A failing chunk is rolled back and its views are retried one by one through process_view,
+    so a bad view never costs more than its own chunk. The group is assimilated into one undo."""
+    with TransactionGroup(doc, __title__) as tg:
+        tg.Start()
+        create_room_tags(doc, view_ids, room_tag_type)
+        for first in range(0, len(view_ids), VIEWS_PER_TRANSACTION):
+            chunk = view_ids[first:first + VIEWS_PER_TRANSACTION]
+            t = Transaction(doc, "Center Room Tags ({}-{})".format(first + 1, first + len(chunk)))
+            counts = move_report.counts()
+            try:
+                t.Start()
+                for view_id in chunk:
+                    center_room_tags(doc, doc.GetElement(view_id))
+                t.Commit()
+            except Exception as e:
+                if t.HasStarted() and not t.HasEnded():
+                    t.RollBack()
+                move_report.restore(counts)
+                print("Chunk of views {}-{} rolled back, retrying them one by one: {}".format(first + 1, first + len(chunk), e))
+                # Outside any transaction, so process_view may still open a view if it has to
+                for view_id in chunk:
+                    try:
+                        process_view(doc, view_id, room_tag_type)
+                    except Exception as e:
+                        print("Error tagging view {}: {}".format(view_id, str(e)))
+            finally:
+                t.Dispose()
+        tg.Assimilate()
+
+def plan_view_queue(doc, sheets):
+    """Unique plan views placed on the sheets, grouped by level: [(level id (int), [view ids])].
+    A view on several sheets is queued once, and the views of one level run back to back
+    so they share the rooms' label points."""
+    queued_ids = set()
+    view_ids_by_level = {}
+    level_order = []
+    placed = 0
+    for sheet in sheets:
+        for view_id in sheet.GetAllPlacedViews():
+            view = doc.GetElement(view_id)
+            if not isinstance(view, ViewPlan):  # Make sure it's a view that can be activated (not a sheet)
+                continue
+            placed += 1
+            if view_id.IntegerValue in queued_ids:
+                continue
+            queued_ids.add(view_id.IntegerValue)
+            level_id = view.GenLevel.Id.IntegerValue if view.GenLevel else -1
+            if level_id not in view_ids_by_level:
+                view_ids_by_level[level_id] = []
+                level_order.append(level_id)
+            view_ids_by_level[level_id].append(view_id)
+    print("Plans placed on sheets: {}, unique: {}, levels: {}".format(placed, len(queued_ids), len(level_order)))
+    return [(level_id, view_ids_by_level[level_id]) for level_id in level_order]
+
 def collect_sheets(doc):
     all_sheets = FilteredElementCollector(doc).OfClass(ViewSheet).ToElements()
     selected_sheets = forms.SelectFromList.show([s.SheetNumber + " - " + s.Name for s in all_sheets], title='Select Sheets', multiselect=True)
@@ -33,121 +115,160 @@ def collect_sheets(doc):
 
 def select_room_tag(doc):
     collector = FilteredElementCollector(doc).OfClass(FamilySymbol).OfCategory(BuiltInCategory.OST_RoomTags)
-    room_tags = {tag.FamilyName: tag for tag in collector}
+    # One option per type: "Family : Type", so every type of a family can be picked
+    room_tags = {"{} : {}".format(tag.FamilyName, tag.get_Parameter(BuiltInParameter.SYMBOL_NAME_PARAM).AsString()): tag
+                 for tag in collector}
     if not room_tags:
         print("No Room Tags found in the document.")
         return None
     selected_tag_name = forms.SelectFromList.show(sorted(room_tags.keys()), title='Select Room Tag Type')
     return room_tags[selected_tag_name] if selected_tag_name else None
 
+def collect_tagged_room_ids(doc, view_id):
+    """Ids (int) of the rooms that already have a room tag in the view, collected once per view."""
+    room_tags = FilteredElementCollector(doc, view_id).OfCategory(BuiltInCategory.OST_RoomTags).WhereElementIsNotElementType()
+    return set(tag.TaggedLocalRoomId.IntegerValue for tag in room_tags)
+
 def tag_all_rooms(doc, view_id, room_tag_type):
     view = doc.GetElement(view_id)
     if isinstance(view, ViewPlan):
         print("Placing room tags for view {}".format(view.Id))
         with Transaction(doc, "Place Room Tags") as t:
             t.Start()
-            rooms = FilteredElementCollector(doc, view_id).OfCategory(BuiltInCategory.OST_Rooms).WhereElementIsNotElementType().ToElements()
-            print("Total rooms in view {} are {}".format(view_id,len(rooms)))
-            for room in rooms:
-                # Check if the room already has a tag in this view
-                if not any(tag.Room.Id == room.Id for tag in FilteredElementCollector(doc, view_id).OfClass(IndependentTag).ToElements()):
-                    room_location = room.Location
-                    if room_location and isinstance(room_location, LocationPoint):
-                        # Use the room's location point as the tag location
-                        location_point = room_location.Point
-                        tag_point = UV(location_point.X, location_point.Y)
-
-                        roomId = LinkElementId(room.Id)
-                        # Create a new room tag at the room's location
-                        try:
-                            roomTag = doc.Create.NewRoomTag(roomId, tag_point, view_id)
-                            if roomTag is None:
-                                raise Exception("Create a new room tag failed.")
-                        except Exception as e:
-                            print("Error creating room tag for room {}: {}".format(room.Id, e))
+            place_room_tags(doc, view_id, room_tag_type)
+            t.Commit()
 
+def untagged_rooms(doc, view_id):
+    """Rooms of a plan that can be tagged and have no tag in it yet."""
+    rooms = FilteredElementCollector(doc, view_id).OfCategory(BuiltInCategory.OST_Rooms).WhereElementIsNotElementType().ToElements()
+    print("Total rooms in view {} are {}".format(view_id,len(rooms)))
+    tagged_room_ids = collect_tagged_room_ids(doc, view_id)
+    # Check if the room already has a tag in this view (unplaced / unenclosed rooms are left out)
+    return [room for room in rooms
+            if room.Id.IntegerValue not in tagged_room_ids and room_states.usable(room)
+            and isinstance(room.Location, LocationPoint)]
+
+def new_room_tag(doc, room, view_id, room_tag_type):
+    """Create one room tag of the selected type at the room's label point."""
+    # Use the room's label point (shared by every plan of the level), else its location point
+    location_point = label_points.get(room) or room.Location.Point
+    tag_point = UV(location_point.X, location_point.Y)
+
+    roomTag = doc.Create.NewRoomTag(LinkElementId(room.Id), tag_point, view_id)
+    if roomTag is None:
+        raise Exception("Create a new room tag failed.")
+    # Apply the selected type straight away, instead of a second pass over every tag
+    if room_tag_type is not None and roomTag.GetTypeId() != room_tag_type.Id:
+        roomTag.ChangeTypeId(room_tag_type.Id)
+    return roomTag
+
+def place_room_tags(doc, view_id, room_tag_type):
+    """Tag every untagged room of a plan; runs inside the caller's transaction.
+    A NEEDS_ACTIVE_VIEW failure is raised, so the caller can open the view and try again."""
+    for room in untagged_rooms(doc, view_id):
+        try:
+            new_room_tag(doc, room, view_id, room_tag_type)
+        except NEEDS_ACTIVE_VIEW:
+            raise
+        except Exception as e:
+            print("Error creating room tag for room {}: {}".format(room.Id, e))
+
+def create_room_tags(doc, view_ids, room_tag_type):
+    """Tag the untagged rooms of all queued plans in one pass, TAGS_PER_TRANSACTION tags per transaction.
+    Rooms are gathered for every view before the first tag is created. A failing chunk is
+    rolled back and its tags are retried one transaction each; tags that fail only because
+    their view is not open (NEEDS_ACTIVE_VIEW) are placed last, opening each such view once.
+    Returns the number of tags created."""
+    jobs = [(view_id, room) for view_id in view_ids for room in untagged_rooms(doc, view_id)]
+    print("Room tags to create: {}".format(len(jobs)))
+    created = 0
+    deferred_view_ids = []
+    deferred_rooms = {}
+    start = time.time()
+    for first in range(0, len(jobs), TAGS_PER_TRANSACTION):
+        chunk = jobs[first:first + TAGS_PER_TRANSACTION]
+        t = Transaction(doc, "Place Room Tags ({}-{})".format(first + 1, first + len(chunk)))
+        try:
+            t.Start()
+            for view_id, room in chunk:
+                new_room_tag(doc, room, view_id, room_tag_type)
             t.Commit()
+            created += len(chunk)
+        except Exception as e:
+            if t.HasStarted() and not t.HasEnded():
+                t.RollBack()
+            print("Room tags {}-{} rolled back, retrying them one by one: {}".format(first + 1, first + len(chunk), e))
+            for view_id, room in chunk:
+                try:
+                    with Transaction(doc, "Place Room Tag") as single:
+                        single.Start()
+                        new_room_tag(doc, room, view_id, room_tag_type)
+                        single.Commit()
+                    created += 1
+                except NEEDS_ACTIVE_VIEW:
+                    if view_id.IntegerValue not in deferred_rooms:
+                        deferred_view_ids.append(view_id)
+                    deferred_rooms.setdefault(view_id.IntegerValue, []).append(room)
+                except Exception as e:
+                    print("Error creating room tag for room {}: {}".format(room.Id, e))
+        finally:
+            t.Dispose()
+    # No transaction is open here, so the views can be made active
+    for view_id in deferred_view_ids:
+        rooms = deferred_rooms[view_id.IntegerValue]
+        print("Headless tagging needs view {} open for {} rooms".format(view_id, len(rooms)))
+        set_active_view(doc, view_id)
+        with Transaction(doc, "Place Room Tags") as t:
+            t.Start()
+            for room in rooms:
+                try:
+                    new_room_tag(doc, room, view_id, room_tag_type)
+                    created += 1
+                except Exception as e:
+                    print("Error creating room tag for room {}: {}".format(room.Id, e))
+            t.Commit()
+    elapsed = time.time() - start
+    print("Room tags created: {} in {:.1f} s ({:.0f} tags/s)".format(created, elapsed, created / elapsed if elapsed > 0 else 0))
+    return created
 
 
 #========================================================================================
 # STEP 1 - FUNCTIONS TO MOVE TAGS
 #========================================================================================
 
-def move_room_and_tag(tag, room, new_pt):
-    """Function to move both Room and Tag Locations, if they are not part of the group.
-    :param tag:     Room Tag
-    :param room:    Room
-    :param new_pt:  XYZ Point."""
-    if room.GroupId == ElementId(-1): #ElementId(-1) means None
-        room.Location.Point = new_pt
-
-    if tag.GroupId == ElementId(-1):
-        tag.Location.Point = new_pt
-
 def align_tags(doc, view_id):
 
     view = doc.GetElement(view_id)
     if isinstance(view, ViewPlan):
         print("Aligning Tags in View:{}".format(view.Id))
-        # ELEMENTS
-        all_room_tags = FilteredElementCollector(doc, view.Id)\
-            .OfCategory(BuiltInCategory.OST_RoomTags).WhereElementIsNotElementType().ToElements()
         with Transaction(doc, __title__) as t:
             t.Start()
+            center_room_tags(doc, view)
+            t.Commit()
 
-            for tag in all_room_tags:
-                # ROOM DATA
-                room = tag.Room
-                room_bb = room.get_BoundingBox(view)
-                room_center = (room_bb.Min + room_bb.Max) / 2
-
-                # MOVE TO CENTER (if possible)
-                if room.IsPointInRoom(room_center):
-                    move_room_and_tag(tag, room, room_center)
-
-                # FIND ANOTHER LOCATION
-                else:
-                    room_boundaries = room.GetBoundarySegments(SpatialElementBoundaryOptions())
-                    if len(room_boundaries) > 0:  # Check if there are boundaries
-                        room_segments = room_boundaries[0]
-
-                        # Get Longest Segment
-                        length = 0
-                        longest_curve = None
-
-                        for seg in room_segments:
-                            curve = seg.GetCurve()
-                            if curve.Length > length:
-                                longest_curve = curve
-                                length = curve.Length
-
-                        # Get middle point on Curve
-                        pt_start = longest_curve.GetEndPoint(0)
-                        pt_end = longest_curve.GetEndPoint(1)
-                        pt_mid = (pt_start + pt_end) / 2
-
-                        pt_up = XYZ(pt_mid.X, pt_mid.Y + step, pt_mid.Z)
-                        pt_down = XYZ(pt_mid.X, pt_mid.Y - step, pt_mid.Z)
-                        pt_right = XYZ(pt_mid.X + step, pt_mid.Y, pt_mid.Z)
-                        pt_left = XYZ(pt_mid.X - step, pt_mid.Y, pt_mid.Z)
-
-                        # Move on X Axis
-                        if not (room.IsPointInRoom(pt_up) and room.IsPointInRoom(pt_down)):
-                            if room.IsPointInRoom(pt_up):
-                                move_room_and_tag(tag, room, pt_up)
-
-                            elif room.IsPointInRoom(pt_down):
-                                move_room_and_tag(tag, room, pt_down)
-
-                        # Move on Y Axis
-                        elif not (room.IsPointInRoom(pt_right) and room.IsPointInRoom(pt_left)):
-                            if room.IsPointInRoom(pt_right):
-                                move_room_and_tag(tag, room, pt_right)
-
-                            elif room.IsPointInRoom(pt_left):
-                                move_room_and_tag(tag, room, pt_left)
+def center_room_tags(doc, view):
+    """Move every room tag of a plan (and its room) to the room's label point; runs inside the caller's transaction."""
+    # ELEMENTS
+    all_room_tags = FilteredElementCollector(doc, view.Id)\
+        .OfCategory(BuiltInCategory.OST_RoomTags).WhereElementIsNotElementType().ToElements()
+    # Only tags of placed, enclosed rooms get the geometry work below
+    all_room_tags = room_states.usable_tags(all_room_tags)
 
-            t.Commit()
+    # Tags an earlier de-overlap run moved off their room's centre stay there, so reruns change nothing
+    targets = dict((tag.Id.IntegerValue, label_points.get(tag.Room)) for tag in all_room_tags)
+    settled = deoverlapped_tags(view, all_room_tags, targets, label_points.boundary_cache) if DEOVERLAP else set()
+
+    for tag in all_room_tags:
+        # ROOM DATA
+        room = tag.Room
+
+        # MOVE TO THE POLE OF INACCESSIBILITY (farthest point from the walls), unless already there
+        move_report.move(tag, room, targets[tag.Id.IntegerValue], move_tag=tag.Id.IntegerValue not in settled)
+
+    # OPTIONAL: NUDGE TAGS OFF EACH OTHER (extents are read after the moves above)
+    if DEOVERLAP:
+        doc.Regenerate()
+        move_report.separate(view, all_room_tags, label_points.boundary_cache)
 
 
 
@@ -156,7 +277,17 @@ def align_tags(doc, view_id):
 #========================================================================================
 
 # CONTROLS
-step = 2 # INTERNAL UNITS IN FEET
+label_precision = LABEL_PRECISION # INTERNAL UNITS IN FEET, smaller is more exact but slower
+HEADLESS = True # Tag through view ids only, without making each view active
+BATCH = True # One undoable TransactionGroup for the whole run (needs HEADLESS)
+VIEWS_PER_TRANSACTION = 10 # Views committed together; a failure rolls back only its own chunk
+TAGS_PER_TRANSACTION = 500 # New room tags committed together in batch mode
+DEOVERLAP = False # Move overlapping tags to free spots inside their rooms after centring
+NEEDS_ACTIVE_VIEW = (InvalidOperationException,) # Failures that opening the view can fix; anything else is reported, not retried
+opened_view_ids = []
+move_report = MoveReport()
+room_states = RoomStates(get_boundary_cache(doc)) # Room id -> placement state, problem rooms are skipped
+label_points = RoomLabelPoints(get_boundary_cache(doc), label_precision) # Room id -> label point, for the whole run
 
 
 
@@ -165,19 +296,24 @@ if __name__ == "__main__":
     if sheets:
         room_tag_type = select_room_tag(doc)
         if room_tag_type:
-            for sheet in sheets:
-                view_ids = sheet.GetAllPlacedViews()
-                for view_id in view_ids:
-                    view = doc.GetElement(view_id)
-                    if isinstance(view, ViewPlan):  # Make sure it's a view that can be activated (not a sheet)
-                        try:
-                            # Switch the active view
-                            set_active_view(doc, view_id)
-                            tag_all_rooms(doc, view_id, room_tag_type)  # Pass the current sheet as a list to tag_all_rooms
-                            align_tags(doc,view_id)
-                            # Perform your operations on the active view here
-                        except Exception as e:
-                            print("Error setting active view: {}".format(str(e)))
+            # Plans placed on the selected sheets, once each, level by level
+            plan_ids = [view_id for level_id, view_ids in plan_view_queue(doc, sheets) for view_id in view_ids]
+
+            if BATCH and HEADLESS:
+                process_views_batched(doc, plan_ids, room_tag_type)
+            else:
+                for view_id in plan_ids:
+                    try:
+                        process_view(doc, view_id, room_tag_type)
+                    except Exception as e:
+                        print("Error tagging view {}: {}".format(view_id, str(e)))
+
+            # UI is redrawn once, at the end of the run
+            uidoc.RefreshActiveView()
+            print("Views opened during the run: {}".format(len(opened_view_ids)))
+            print("Room label points computed: {}".format(len(label_points)))
+            print(move_report)
+            print(room_states.summary())
 
         else:
             print("No Room Tag type selected.")
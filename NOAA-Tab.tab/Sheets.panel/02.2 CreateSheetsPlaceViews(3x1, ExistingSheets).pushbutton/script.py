@@ -23,6 +23,7 @@ import Autodesk.Revit.DB as DB
 clr.AddReference('RevitAPI')
 from Autodesk.Revit.DB import *
 from Autodesk.Revit.UI import TaskDialog
+from noaa.boundaries import get_boundary_cache
 
 app = __revit__.Application
 doc = __revit__.ActiveUIDocument.Document
@@ -141,7 +142,7 @@ def collect_filled_region_types(doc):
 
 def create_filled_region_from_area_boundaries(doc, alphanumeric_sheet_title, target_view_id, collected_fill_pattern):
     print("FILLED REGION INITIATED")
-    boundaryOptions = SpatialElementBoundaryOptions()
+    boundary_cache = get_boundary_cache(doc)
     areas = FilteredElementCollector(doc, target_view_id).OfCategory(BuiltInCategory.OST_Areas).WhereElementIsNotElementType().ToElements()
     print("Number of areas collected: ", len(areas))
 
@@ -158,22 +159,11 @@ def create_filled_region_from_area_boundaries(doc, alphanumeric_sheet_title, tar
         #area_param = re.sub(r'\W+', '', (area.LookupParameter("Apartment Type")).AsString()).upper()
         if area_param and area_param and  area_param in alphanumeric_sheet_title:
             print("Area found: ", area.Id)
-            boundary_segments = area.GetBoundarySegments(boundaryOptions)
-            curves = []
-
-            # Process each boundary segment to collect curves
-            for boundaryList in boundary_segments:
-                for segment in boundaryList:
-                    curve = segment.GetCurve()
-                    curves.append(curve)
-
-            # Ensure continuity and create a CurveLoop for the Filled Region
-            curve_loop = CurveLoop()
-            for i, curve in enumerate(curves):
-                next_curve = curves[(i + 1) % len(curves)]
-                if not curve.GetEndPoint(1).IsAlmostEqualTo(next_curve.GetEndPoint(0)):
-                    curve = Line.CreateBound(curve.GetEndPoint(0), next_curve.GetEndPoint(0))
-                curve_loop.Append(curve)
+            # Closed boundary loops (outer + holes), extracted once per area by the shared cache
+            curve_loops = boundary_cache.get(area).curve_loops
+            if not curve_loops:
+                print("No boundary found for area:", area.Id)
+                continue
 
             # Check for a valid FilledRegionType
             filledRegionTypes = FilteredElementCollector(doc).OfClass(FilledRegionType).ToElements()
@@ -187,7 +177,7 @@ def create_filled_region_from_area_boundaries(doc, alphanumeric_sheet_title, tar
             with Transaction(doc, "Create Filled Region") as t:
                 t.Start()
                 try:
-                    FilledRegion.Create(doc, filledRegionType.Id, target_view_id, [curve_loop])
+                    FilledRegion.Create(doc, filledRegionType.Id, target_view_id, curve_loops)
                     print("Filled Region created successfully.")
                 except Exception as e:
                     print("Failed to create Filled Region:", e)
@@ -0,0 +1,5 @@
+"""Shared helpers for the NOAA-Tab pushbuttons.
+
+pyRevit puts this extension's lib folder on the search path, so every script
+can do `from noaa import geometry`.
+"""
@@ -0,0 +1,90 @@
+"""Apartment catalogue built from the Area elements of a document.
+
+Every area's `Number` is read once and, when it follows the W<wing>-<floor>-<unit>
+convention (e.g. W1-05-12), parsed into an ApartmentKey. Parsed apartments are
+partitioned by level and kept sorted, so per-level and range lookups need no
+further API calls.
+"""
+
+import re
+from bisect import bisect_left, bisect_right
+from collections import namedtuple
+
+APARTMENT_NUMBER_PATTERN = re.compile(r'W(\d{1})-(\d{2})-(\d{2})')
+
+ApartmentKey = namedtuple("ApartmentKey", ["wing", "floor", "unit"])
+
+
+def parse_apartment_number(number):
+    """Return the ApartmentKey of an apartment number, or None if it does not follow the convention."""
+    match = APARTMENT_NUMBER_PATTERN.match(number or '')
+    if not match:
+        return None
+    return ApartmentKey(int(match.group(1)), int(match.group(2)), int(match.group(3)))
+
+
+class Apartment(object):
+    """One numbered area."""
+    __slots__ = ("area", "area_id", "number", "key", "level_id")
+
+    def __init__(self, area, number):
+        self.area = area
+        self.area_id = area.Id.IntegerValue
+        self.number = number
+        self.key = parse_apartment_number(number)
+        self.level_id = area.LevelId.IntegerValue
+
+    def __repr__(self):
+        return "<Apartment {} (area {})>".format(self.number, self.area_id)
+
+
+class ApartmentCatalogue(object):
+    """All areas of a document (`areas`), numbered ones indexed by area id, number and level."""
+
+    def __init__(self, areas):
+        self.areas = list(areas)
+        self.by_area_id = {}
+        self.by_number = {}
+        self.by_level = {}
+        for area in self.areas:
+            number_param = area.LookupParameter('Number')
+            number = number_param.AsString() if number_param else None
+            if not number:
+                continue
+            apartment = Apartment(area, number)
+            self.by_area_id[apartment.area_id] = apartment
+            self.by_number.setdefault(number, []).append(apartment)
+            if apartment.key is not None:
+                self.by_level.setdefault(apartment.level_id, []).append(apartment)
+
+        self._keys_by_level = {}
+        for level_id, apartments in self.by_level.items():
+            apartments.sort(key=lambda a: (a.key, a.number, a.area_id))
+            self._keys_by_level[level_id] = [a.key for a in apartments]
+
+    @classmethod
+    def from_document(cls, doc):
+        from Autodesk.Revit.DB import BuiltInCategory, FilteredElementCollector
+        return cls(FilteredElementCollector(doc).OfCategory(BuiltInCategory.OST_Areas).WhereElementIsNotElementType())
+
+    def __len__(self):
+        return len(self.by_area_id)
+
+    def get(self, area_id):
+        """Apartment of an area (ElementId or integer id), or None."""
+        return self.by_area_id.get(getattr(area_id, "IntegerValue", area_id))
+
+    def on_level(self, level_id):
+        """Parsed apartments on a level, sorted by key."""
+        return self.by_level.get(getattr(level_id, "IntegerValue", level_id), [])
+
+    def in_range(self, level_id, first_key, last_key):
+        """Parsed apartments on a level with first_key <= key <= last_key."""
+        level_id = getattr(level_id, "IntegerValue", level_id)
+        keys = self._keys_by_level.get(level_id, [])
+        return self.by_level.get(level_id, [])[bisect_left(keys, first_key):bisect_right(keys, last_key)]
+
+    def sort_key(self, number):
+        """Report order: parsed numbers by (wing, floor, unit), the rest by their first 8 characters."""
+        key = parse_apartment_number(number)
+        return (0, key, number) if key is not None else (1, (), number[:8])
@@ -0,0 +1,238 @@
+"""Cached boundary extraction for rooms, areas and spaces.
+
+GetBoundarySegments is the most expensive call the area/room tools make, and
+most of them need the same boundary more than once in a run. BoundaryCache
+keeps, per element and boundary location, the loops as closed CurveLoops and as
+plain (x, y, z) polygons. Arcs and splines are tessellated into chords that stay
+within a chord tolerance, with a bounded number of segments per curve.
+
+An entry is dropped when the element's Area, Perimeter or plan extent no longer
+match the values seen at extraction time, or when `invalidate` is called for it
+(as the model updaters do).
+"""
+
+from Autodesk.Revit.DB import Arc, CurveLoop, Line, SpatialElementBoundaryLocation, SpatialElementBoundaryOptions
+
+from noaa.geometry import arc_segment_count, polygon_area, simplify_polyline
+
+# Max distance between a curve and the chords replacing it, in feet (~9 mm)
+CHORD_TOLERANCE = 0.03
+# Upper bound of chords per boundary curve, so curved facades stay cheap to test
+MAX_SEGMENTS_PER_CURVE = 64
+# Gaps up to this size (feet) are closed by snapping the curve end, larger ones get a bridging line
+SNAP_TOLERANCE = 0.01
+
+
+class BoundaryLoops(object):
+    """Boundary of one spatial element.
+
+    points:         one polygon of (x, y, z) vertices per loop, first loop is the outer
+                    one, tessellated at the cache's chord tolerance
+    curve_loops:    one closed CurveLoop per loop, in the same order
+    """
+    __slots__ = ("points", "curve_loops", "fingerprint", "_tessellations", "_oriented")
+
+    def __init__(self, points, curve_loops, fingerprint):
+        self.points = points
+        self.curve_loops = curve_loops
+        self.fingerprint = fingerprint
+        self._tessellations = {}
+        self._oriented = None
+
+    def tessellate(self, chord_tolerance=CHORD_TOLERANCE, max_segments=MAX_SEGMENTS_PER_CURVE):
+        """Polygons of every loop at another chord tolerance, computed once per tolerance."""
+        key = (chord_tolerance, max_segments)
+        polygons = self._tessellations.get(key)
+        if polygons is None:
+            polygons = [tessellate_curve_loop(loop, chord_tolerance, max_segments) for loop in self.curve_loops]
+            self._tessellations[key] = polygons
+        return polygons
+
+    def oriented_curve_loops(self, min_area=0.0):
+        """Loops for Ceiling/Floor.Create: the largest one first and counter-clockwise, the
+        others (holes) clockwise, each enclosing more than min_area. Computed once per
+        entry; loops that need flipping are copied, the cached ones are never changed."""
+        if self._oriented is None or self._oriented[0] != min_area:
+            areas = [polygon_area(points) for points in self.points]
+            order = sorted(range(len(areas)), key=lambda k: -abs(areas[k]))
+            loops = []
+            for rank, k in enumerate(order):
+                if abs(areas[k]) <= min_area:
+                    continue
+                loop = self.curve_loops[k]
+                if (areas[k] > 0) != (rank == 0):
+                    loop = CurveLoop.CreateViaCopy(loop)
+                    loop.Flip()
+                loops.append(loop)
+            self._oriented = (min_area, loops)
+        return self._oriented[1]
+
+    def __bool__(self):
+        return bool(self.points)
+
+    __nonzero__ = __bool__  # IronPython
+
+    @property
+    def outer_points(self):
+        return self.points[0] if self.points else []
+
+    @property
+    def outer_curve_loop(self):
+        return self.curve_loops[0] if self.curve_loops else None
+
+
+def _fingerprint(element):
+    """Cheap properties that change whenever the element's boundary changes shape or position.
+
+    Area and Perimeter alone miss a room that moves with its walls unchanged,
+    so the plan extent of the element's bounding box is added (its location
+    point when it has none).
+    """
+    bb = element.get_BoundingBox(None)
+    if bb is not None:
+        position = (bb.Min.X, bb.Min.Y, bb.Max.X, bb.Max.Y)
+    else:
+        location = getattr(element.Location, "Point", None)
+        position = (location.X, location.Y) if location is not None else ()
+    return (element.Area, element.Perimeter, element.LevelId.IntegerValue) + position
+
+
+def tessellate_curve(curve, chord_tolerance=CHORD_TOLERANCE, max_segments=MAX_SEGMENTS_PER_CURVE):
+    """Vertices of the chords approximating a curve, start point included, end point excluded."""
+    if isinstance(curve, Line):
+        start = curve.GetEndPoint(0)
+        return [(start.X, start.Y, start.Z)]
+    if isinstance(curve, Arc):
+        count = arc_segment_count(curve.Radius, curve.Length / curve.Radius, chord_tolerance, max_segments)
+        points = [curve.Evaluate(float(k) / count, True) for k in range(count)]
+        return [(p.X, p.Y, p.Z) for p in points]
+
+    # Splines, ellipses...: Revit's fine tessellation, thinned to the chord tolerance
+    points = [(p.X, p.Y, p.Z) for p in curve.Tessellate()]
+    points = simplify_polyline(points, chord_tolerance)
+    if len(points) - 1 > max_segments:
+        step = float(len(points) - 1) / max_segments
+        points = [points[int(round(k * step))] for k in range(max_segments)] + [points[-1]]
+    return points[:-1]
+
+
+def tessellate_curve_loop(curve_loop, chord_tolerance=CHORD_TOLERANCE, max_segments=MAX_SEGMENTS_PER_CURVE):
+    """Polygon of (x, y, z) vertices for a closed curve loop."""
+    points = []
+    for curve in curve_loop:
+        for point in tessellate_curve(curve, chord_tolerance, max_segments):
+            if not points or points[-1] != point:
+                points.append(point)
+    return points
+
+
+def chain_curves(curves, tolerance=SNAP_TOLERANCE):
+    """Curves of one loop put head to tail, each starting where the previous one ends.
+
+    Sketch profiles list their curves in no particular order or direction; a
+    curve is reversed when its end, not its start, meets the chain. Where
+    nothing is within tolerance the nearest curve end is taken.
+    """
+    remaining = list(curves)
+    if not remaining:
+        return []
+    chain = [remaining.pop(0)]
+    while remaining:
+        end = chain[-1].GetEndPoint(1)
+        best = None
+        for i, curve in enumerate(remaining):
+            for reverse in (False, True):
+                distance = curve.GetEndPoint(1 if reverse else 0).DistanceTo(end)
+                if best is None or distance < best[0]:
+                    best = (distance, i, reverse)
+            if best[0] <= tolerance:
+                break
+        _, i, reverse = best
+        curve = remaining.pop(i)
+        chain.append(curve.CreateReversed() if reverse else curve)
+    return chain
+
+
+def _snap_end(curve, end_point):
+    """Rebuild a curve so it ends exactly at end_point, keeping its shape."""
+    if isinstance(curve, Arc):
+        return Arc.Create(curve.GetEndPoint(0), end_point, curve.Evaluate(0.5, True))
+    return Line.CreateBound(curve.GetEndPoint(0), end_point)
+
+
+def _closed_curve_loop(curves):
+    """Append curves into a CurveLoop, closing gaps between consecutive curves.
+
+    Tiny gaps are closed by snapping the curve's end onto the next start (arcs
+    stay arcs); larger gaps keep the curve and add a bridging line.
+    """
+    curve_loop = CurveLoop()
+    for i, curve in enumerate(curves):
+        next_start = curves[(i + 1) % len(curves)].GetEndPoint(0)
+        end = curve.GetEndPoint(1)
+        if end.IsAlmostEqualTo(next_start):
+            curve_loop.Append(curve)
+        elif end.DistanceTo(next_start) <= SNAP_TOLERANCE:
+            curve_loop.Append(_snap_end(curve, next_start))
+        else:
+            curve_loop.Append(curve)
+            curve_loop.Append(Line.CreateBound(end, next_start))
+    return curve_loop
+
+
+class BoundaryCache(object):
+    """Per-document cache of spatial element boundaries."""
+
+    def __init__(self, chord_tolerance=CHORD_TOLERANCE, max_segments=MAX_SEGMENTS_PER_CURVE):
+        self.chord_tolerance = chord_tolerance
+        self.max_segments = max_segments
+        self._entries = {}
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, element, location=SpatialElementBoundaryLocation.Finish):
+        """Return the BoundaryLoops of a Room/Area/Space (empty if it has no boundary)."""
+        key = (element.Id.IntegerValue, str(location))
+        fingerprint = _fingerprint(element)
+        entry = self._entries.get(key)
+        if entry is not None and entry.fingerprint == fingerprint:
+            self.hits += 1
+            return entry
+
+        self.misses += 1
+        options = SpatialElementBoundaryOptions()
+        options.SpatialElementBoundaryLocation = location
+        points = []
+        curve_loops = []
+        for boundary_list in element.GetBoundarySegments(options) or []:
+            curves = [segment.GetCurve() for segment in boundary_list]
+            if not curves:
+                continue
+            curve_loop = _closed_curve_loop(curves)
+            curve_loops.append(curve_loop)
+            points.append(tessellate_curve_loop(curve_loop, self.chord_tolerance, self.max_segments))
+
+        entry = BoundaryLoops(points, curve_loops, fingerprint)
+        self._entries[key] = entry
+        return entry
+
+    def invalidate(self, element_ids=None):
+        """Forget the given ElementIds / integer ids, or everything when None."""
+        if element_ids is None:
+            self._entries.clear()
+            return
+        stale = set(getattr(e, "IntegerValue", e) for e in element_ids)
+        for key in [k for k in self._entries if k[0] in stale]:
+            del self._entries[key]
+
+
+_CACHES = {}
+
+
+def get_boundary_cache(doc):
+    """Return the BoundaryCache shared by every tool working on this document."""
+    key = doc.GetHashCode()
+    cache = _CACHES.get(key)
+    if cache is None:
+        cache = _CACHES[key] = BoundaryCache()
+    return cache
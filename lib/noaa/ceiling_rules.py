@@ -0,0 +1,100 @@
+"""Rules table mapping rooms to a ceiling type, height offset and parameter values.
+
+A table is a CSV file or a JSON list of objects, one rule per row:
+
+    field           room parameter the rule looks at, e.g. Name, Department or Zone
+    pattern         exact value (case-insensitive), a `*` / `?` wildcard, or `re:` + a regex
+    ceiling_type    ceiling type name
+    offset_mm       height offset from level in millimetres (empty = 0)
+    other columns   written as-is to the ceiling parameter of the same name
+
+The first matching row wins. Exact patterns are kept in one dict per field and
+wildcards/regexes are compiled once when the table is loaded, so resolving a
+room costs a few dict lookups and the (usually few) compiled patterns.
+"""
+
+import csv
+import fnmatch
+import io
+import json
+import re
+
+RULE_COLUMNS = ("field", "pattern", "ceiling_type", "offset_mm")
+REGEX_PREFIX = "re:"
+
+
+class CeilingRule(object):
+    """One row of the rules table."""
+    __slots__ = ("index", "field", "pattern", "ceiling_type", "offset", "values")
+
+    def __init__(self, index, row):
+        self.index = index
+        self.field = (row.get("field") or "").strip()
+        self.pattern = (row.get("pattern") or "").strip()
+        self.ceiling_type = (row.get("ceiling_type") or "").strip()
+        offset_mm = str(row.get("offset_mm") or "").strip()
+        self.offset = float(offset_mm) / 304.8 if offset_mm else 0.0
+        self.values = dict((name, value) for name, value in row.items()
+                           if name not in RULE_COLUMNS and value not in (None, ""))
+
+    def __repr__(self):
+        return "<CeilingRule {}: {} = {!r} -> {}>".format(self.index + 1, self.field, self.pattern, self.ceiling_type)
+
+
+class CeilingRules(object):
+    """Compiled rules table."""
+
+    def __init__(self, rows):
+        self.rules = []
+        self._exact = {}       # field -> {lowercase value: first rule}
+        self._patterns = {}    # field -> [(compiled regex, rule)], in table order
+        for index, row in enumerate(rows):
+            rule = CeilingRule(index, row)
+            if not rule.field or not rule.pattern or not rule.ceiling_type:
+                raise ValueError("Rule {} needs field, pattern and ceiling_type: {}".format(index + 1, row))
+            self.rules.append(rule)
+            if rule.pattern.startswith(REGEX_PREFIX):
+                regex = re.compile(rule.pattern[len(REGEX_PREFIX):], re.IGNORECASE)
+                self._patterns.setdefault(rule.field, []).append((regex, rule))
+            elif "*" in rule.pattern or "?" in rule.pattern:
+                regex = re.compile(fnmatch.translate(rule.pattern), re.IGNORECASE)
+                self._patterns.setdefault(rule.field, []).append((regex, rule))
+            else:
+                self._exact.setdefault(rule.field, {}).setdefault(rule.pattern.lower(), rule)
+        self.fields = sorted(set(rule.field for rule in self.rules))
+
+    @classmethod
+    def load(cls, path):
+        """Read a .json (list of objects) or .csv (header row) rules table."""
+        with io.open(path, encoding="utf-8-sig") as f:
+            if path.lower().endswith(".json"):
+                return cls(json.load(f))
+            return cls(list(csv.DictReader(f)))
+
+    def __len__(self):
+        return len(self.rules)
+
+    def match(self, values):
+        """First rule matching {field: room value}, or None."""
+        best = None
+        for field, value in values.items():
+            if not value:
+                continue
+            rule = self._exact.get(field, {}).get(value.lower())
+            if rule is not None and (best is None or rule.index < best.index):
+                best = rule
+            for regex, rule in self._patterns.get(field, ()):
+                if best is not None and rule.index > best.index:
+                    break
+                if regex.match(value):
+                    best = rule
+                    break
+        return best
+
+    def match_room(self, room):
+        """First rule matching a room's parameters, or None."""
+        values = {}
+        for field in self.fields:
+            parameter = room.LookupParameter(field)
+            values[field] = parameter.AsString() if parameter else None
+        return self.match(values)
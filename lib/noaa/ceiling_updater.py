@@ -0,0 +1,151 @@
+"""Dynamic model updater keeping generated ceilings on their rooms' boundaries.
+
+Every ceiling made by the ceiling buttons carries its source room in extensible
+storage (see noaa.ceilings.set_source_room). When a room's geometry changes
+(walls moved, separation lines edited...) only the ceilings made from that room
+are rebuilt.
+
+A ceiling's sketch cannot be edited from an updater (SketchEditScope needs its
+own transaction), so "rebuilding" creates a ceiling of the same type, level,
+workset and writable parameters on the new boundary and deletes the old one;
+the ceiling's ElementId therefore changes. Rooms that are no
+longer enclosed keep their ceiling as it is.
+"""
+
+from Autodesk.Revit.DB import (BuiltInCategory, BuiltInParameter, Ceiling, ChangePriority, Element,
+                               ElementCategoryFilter, ElementId, FilteredElementCollector, StorageType)
+from Autodesk.Revit.DB.ExtensibleStorage import ExtensibleStorageFilter
+from System import Guid
+
+from noaa.boundaries import get_boundary_cache
+from noaa.ceilings import SOURCE_ROOM_SCHEMA_GUID, ceiling_boundary, ceiling_rings, set_source_room, source_room_id
+from noaa.geometry import polygon_area, polygon_bbox
+from noaa.updaters import ModelUpdater, get_logger, register_updater
+
+UPDATER_GUID = Guid("a4d8e2f1-6b3c-4e59-8d17-2c9f0b5e7a61")
+
+# Footprints whose net area and bbox agree within this (feet / square feet) count as unchanged
+FOOTPRINT_TOLERANCE = 1e-3
+
+
+def ceilings_by_source_room(doc, room_ids):
+    """{room id (int): [ceilings]} of the generated ceilings whose source room is in room_ids."""
+    room_ids = set(getattr(i, "IntegerValue", i) for i in room_ids)
+    ceilings = {}
+    collector = FilteredElementCollector(doc).OfCategory(BuiltInCategory.OST_Ceilings)\
+        .WhereElementIsNotElementType().WherePasses(ExtensibleStorageFilter(SOURCE_ROOM_SCHEMA_GUID))
+    for ceiling in collector:
+        room_id = source_room_id(ceiling)
+        if room_id is not None and room_id.IntegerValue in room_ids:
+            ceilings.setdefault(room_id.IntegerValue, []).append(ceiling)
+    return ceilings
+
+
+def _parameter_value(parameter):
+    """Value of a parameter read by its storage type, or None for StorageType.None."""
+    storage_type = parameter.StorageType
+    if storage_type == StorageType.String:
+        return parameter.AsString()
+    if storage_type == StorageType.Double:
+        return parameter.AsDouble()
+    if storage_type == StorageType.Integer:
+        return parameter.AsInteger()
+    if storage_type == StorageType.ElementId:
+        return parameter.AsElementId()
+    return None
+
+
+def _copy_parameters(source, target):
+    """Copy the workset and every writable parameter (text, numbers, yes/no, ids such as the phase)
+    of one ceiling to another; returns the names of the parameters that could not be set."""
+    failed = []
+    workset = source.get_Parameter(BuiltInParameter.ELEM_PARTITION_PARAM)
+    target_workset = target.get_Parameter(BuiltInParameter.ELEM_PARTITION_PARAM)
+    if workset is not None and target_workset is not None and not target_workset.IsReadOnly:
+        target_workset.Set(workset.AsInteger())
+    for parameter in source.Parameters:
+        if parameter.IsReadOnly or not parameter.HasValue:
+            continue
+        value = _parameter_value(parameter)
+        target_parameter = target.get_Parameter(parameter.Definition)
+        if value is None or target_parameter is None or target_parameter.IsReadOnly:
+            continue
+        try:
+            if not target_parameter.Set(value):
+                failed.append(parameter.Definition.Name)
+        except Exception:
+            failed.append(parameter.Definition.Name)
+    return failed
+
+
+def _footprint_signature(rings):
+    """Net area and bbox of the largest ring: cheap to compare, changes with any real boundary edit."""
+    areas = [abs(polygon_area(ring)) for ring in rings]
+    largest = areas.index(max(areas))
+    return (2 * areas[largest] - sum(areas),) + polygon_bbox(rings[largest])
+
+
+def same_footprint(doc, ceiling, boundaries):
+    """True when a ceiling already follows the room boundary (e.g. only the room's location point moved)."""
+    rings = ceiling_rings(doc, ceiling)
+    if not rings:
+        return False
+    return all(abs(a - b) <= FOOTPRINT_TOLERANCE for a, b in
+               zip(_footprint_signature(rings), _footprint_signature(boundaries.points)))
+
+
+def rebuild_ceiling(doc, ceiling, room, boundary_cache):
+    """Replace a ceiling by one on the room's current boundary; returns the new ceiling, or None
+    when the room has no usable boundary or the ceiling already matches it."""
+    curve_loops, _ = ceiling_boundary(room, boundary_cache)
+    if curve_loops is None or same_footprint(doc, ceiling, boundary_cache.get(room)):
+        return None
+    new_ceiling = Ceiling.Create(doc, curve_loops, ceiling.GetTypeId(), ceiling.LevelId)
+    failed = _copy_parameters(ceiling, new_ceiling)
+    if failed:
+        get_logger(__name__).warning("Ceiling {}: parameters not copied to its rebuilt ceiling {}: {}".format(
+            ceiling.Id, new_ceiling.Id, ", ".join(failed)))
+    set_source_room(new_ceiling, room)
+    doc.Delete(ceiling.Id)
+    return new_ceiling
+
+
+def update_room_ceilings(doc, changed_room_ids):
+    """Rebuild the generated ceilings of the changed rooms.
+
+    Ceilings already matching their room's boundary are left alone.
+    Returns the number of ceilings rebuilt.
+    """
+    if not changed_room_ids:
+        return 0
+    boundary_cache = get_boundary_cache(doc)
+    boundary_cache.invalidate(changed_room_ids)
+    count = 0
+    for room_id, ceilings in ceilings_by_source_room(doc, changed_room_ids).items():
+        room = doc.GetElement(ElementId(room_id))
+        if room is None:
+            continue
+        for ceiling in ceilings:
+            if rebuild_ceiling(doc, ceiling, room, boundary_cache) is not None:
+                count += 1
+    return count
+
+
+class CeilingFollowsRoomUpdater(ModelUpdater):
+    """Model updater around update_room_ceilings."""
+    UPDATER_GUID = UPDATER_GUID
+    NAME = "NOAA Ceiling Follows Room"
+    INFORMATION = "Rebuilds ceilings generated from rooms when the rooms' boundaries change."
+    PRIORITY = ChangePriority.FloorsRoofsStructuralWalls
+
+    def run(self, data):
+        update_room_ceilings(data.GetDocument(), list(data.GetModifiedElementIds()))
+
+    def triggers(self):
+        # Room geometry only: the ceilings this updater writes never re-trigger it
+        return [(ElementCategoryFilter(BuiltInCategory.OST_Rooms), Element.GetChangeTypeGeometry())]
+
+
+def register_ceiling_updater(addin_id):
+    """Register the updater and its trigger once per Revit session."""
+    return register_updater(CeilingFollowsRoomUpdater(addin_id))
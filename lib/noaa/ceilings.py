@@ -0,0 +1,451 @@
+"""Ceilings generated from room boundaries.
+
+Shared by the ceiling buttons. A run is planned first, in pure geometry over
+the cached room boundaries: rooms whose boundary cannot make a ceiling are
+reported instead of failing halfway through a transaction. Every boundary
+loop is used, outer loop first, so cores and courtyards become holes. The
+remaining ceilings are then created in chunked transactions, with a failures
+preprocessor that deletes a ceiling Revit rejects instead of rolling back the
+whole chunk. Ceilings being replaced are only deleted after that, and only
+for rooms whose new ceiling was created.
+"""
+
+import time
+
+import clr
+from Autodesk.Revit.DB import (BuiltInCategory, BuiltInParameter, Ceiling, ElementId, FailureProcessingResult,
+                               FailureSeverity, FilteredElementCollector, IFailuresPreprocessor, StorageType,
+                               Transaction, TransactionGroup, TransactionStatus)
+from Autodesk.Revit.DB.ExtensibleStorage import AccessLevel, Entity, Schema, SchemaBuilder
+from System import Guid
+
+from noaa.boundaries import chain_curves, tessellate_curve
+from noaa.geometry import GridIndex, point_to_rings_distance, polygon_area, polygon_bbox
+from noaa.rooms import RoomLabelPoints, room_label_point
+
+# Room outcomes
+CREATED = "Created"
+INVALID = "Invalid boundary"
+NO_RULE = "No matching rule"
+COVERED = "Already has a ceiling"
+FAILED = "Failed"
+
+# Boundaries enclosing less than this are not turned into ceilings (square feet)
+MIN_CEILING_AREA = 0.1
+# Ceilings committed together
+CEILINGS_PER_TRANSACTION = 100
+# Room parameters copied onto the ceiling (unless a rule gives a value)
+COPIED_PARAMETERS = ("Zone",)
+
+# Extensible storage on each generated ceiling: the room it was made from
+SOURCE_ROOM_SCHEMA_GUID = Guid("3b7e9a52-4c1d-4f86-a0e2-7d5c8b1f9e34")
+SOURCE_ROOM_FIELD = "RoomId"
+
+
+def ceiling_boundary(room, boundary_cache):
+    """Return (curve loops, None) for a room, or (None, reason) when it cannot make a ceiling."""
+    if room.Location is None:
+        return None, "room is not placed"
+    boundaries = boundary_cache.get(room)
+    if not boundaries:
+        return None, "room has no boundary (not enclosed or redundant)"
+    outer = max(boundaries.points, key=lambda points: abs(polygon_area(points)))
+    if len(outer) < 3:
+        return None, "boundary has fewer than 3 vertices"
+    if abs(polygon_area(outer)) < MIN_CEILING_AREA:
+        return None, "boundary encloses no area"
+    min_x, min_y, max_x, max_y = polygon_bbox(outer)
+    if min(max_x - min_x, max_y - min_y) <= 0:
+        return None, "boundary is degenerate"
+    # Every loop, so columns, shafts and courtyards become holes
+    return boundaries.oriented_curve_loops(MIN_CEILING_AREA), None
+
+
+def source_room_schema():
+    """Extensible storage schema recording the room a generated ceiling was made from."""
+    schema = Schema.Lookup(SOURCE_ROOM_SCHEMA_GUID)
+    if schema is None:
+        builder = SchemaBuilder(SOURCE_ROOM_SCHEMA_GUID)
+        builder.SetReadAccessLevel(AccessLevel.Public)
+        builder.SetWriteAccessLevel(AccessLevel.Public)
+        builder.SetSchemaName("NOAACeilingSourceRoom")
+        builder.SetDocumentation("Room a ceiling was generated from, used to rebuild it when the room changes.")
+        builder.AddSimpleField(SOURCE_ROOM_FIELD, clr.GetClrType(ElementId))
+        schema = builder.Finish()
+    return schema
+
+
+def set_source_room(ceiling, room):
+    """Record the source room on a ceiling; needs an open transaction."""
+    entity = Entity(source_room_schema())
+    entity.Set[ElementId](SOURCE_ROOM_FIELD, room.Id)
+    ceiling.SetEntity(entity)
+
+
+def source_room_id(ceiling):
+    """ElementId of the room a ceiling was generated from, or None."""
+    schema = Schema.Lookup(SOURCE_ROOM_SCHEMA_GUID)
+    if schema is None:
+        return None
+    entity = ceiling.GetEntity(schema)
+    if entity is None or not entity.IsValid():
+        return None
+    return entity.Get[ElementId](SOURCE_ROOM_FIELD)
+
+
+class CeilingJob(object):
+    """One room to put a ceiling in, what goes on it, and what happened to it."""
+    __slots__ = ("room", "curve_loops", "type_id", "offset", "values", "replace_ids", "status", "detail", "ceiling_id")
+
+    def __init__(self, room, curve_loops=None, status=None, detail=""):
+        self.room = room
+        self.curve_loops = curve_loops
+        self.type_id = None
+        self.offset = 0.0
+        self.values = {}
+        self.replace_ids = []
+        self.status = status
+        self.detail = detail
+        self.ceiling_id = None
+
+    @property
+    def label(self):
+        number = self.room.LookupParameter('Number')
+        name = self.room.LookupParameter('Name')
+        return "{} {} ({})".format(number.AsString() if number else "", name.AsString() if name else "",
+                                   self.room.Id)
+
+
+def plan_ceilings(rooms, boundary_cache, ceiling_type=None, offset=0.0):
+    """Validate every room and build its curve loops before any transaction is opened.
+
+    Returns the CeilingJobs, all with the given type and offset (see apply_rules
+    for per-room values); invalid rooms already carry their INVALID outcome.
+    """
+    jobs = []
+    for room in rooms:
+        curve_loops, reason = ceiling_boundary(room, boundary_cache)
+        if curve_loops is None:
+            job = CeilingJob(room, status=INVALID, detail=reason)
+        else:
+            job = CeilingJob(room, curve_loops)
+        job.type_id = ceiling_type.Id if ceiling_type is not None else None
+        job.offset = offset
+        job.values = copied_room_values(room)
+        jobs.append(job)
+    return jobs
+
+
+def copied_room_values(room):
+    """Values of COPIED_PARAMETERS on a room, to carry over to its ceiling."""
+    values = {}
+    for name in COPIED_PARAMETERS:
+        parameter = room.LookupParameter(name)
+        if parameter and parameter.AsString():
+            values[name] = parameter.AsString()
+    return values
+
+
+def ceiling_type_name(ceiling_type):
+    return ceiling_type.get_Parameter(BuiltInParameter.SYMBOL_NAME_PARAM).AsString()
+
+
+def apply_rules(jobs, rules, ceiling_types):
+    """Give each planned job the type, offset and values of the first matching rule.
+
+    :param rules:           noaa.ceiling_rules.CeilingRules
+    :param ceiling_types:   CeilingTypes; a rule names one by type name
+    Jobs without a rule, or whose rule names an unknown type, get NO_RULE.
+    """
+    type_ids = {}
+    for ceiling_type in ceiling_types:
+        type_ids.setdefault(ceiling_type_name(ceiling_type), ceiling_type.Id)
+    for job in jobs:
+        if job.status is not None:
+            continue
+        rule = rules.match_room(job.room)
+        if rule is None:
+            job.status, job.detail = NO_RULE, ""
+        elif rule.ceiling_type not in type_ids:
+            job.status, job.detail = NO_RULE, "rule {} names unknown ceiling type '{}'".format(rule.index + 1, rule.ceiling_type)
+        else:
+            job.type_id = type_ids[rule.ceiling_type]
+            job.offset = rule.offset
+            job.values.update(rule.values)
+
+
+def _set_value(parameter, value):
+    """Set a rules-table value (text, or a JSON number / true / false) by the parameter's storage type;
+    returns False when Revit rejects it."""
+    storage_type = parameter.StorageType
+    text = value if isinstance(value, str) else str(value)
+    try:
+        if storage_type == StorageType.String:
+            return parameter.Set(text)
+        if storage_type == StorageType.Integer:
+            # Integers and yes/no: JSON numbers and booleans, or digits in a CSV cell
+            if isinstance(value, (bool, int)):
+                return parameter.Set(int(value))
+            if text.strip().lstrip("-").isdigit():
+                return parameter.Set(int(text))
+            return parameter.SetValueString(text)
+        if storage_type == StorageType.Double:
+            # Lengths, areas...: in project units, as typed in Revit
+            return parameter.SetValueString(text)
+    except Exception:
+        return False
+    return False    # ElementId values cannot be named in a table
+
+
+def set_ceiling_values(ceiling, offset, values):
+    """Write the height offset and {parameter name: value} to a new ceiling.
+
+    Values are converted by the parameter's storage type, see _set_value.
+    Returns the names that could not be written.
+    """
+    ceiling.get_Parameter(BuiltInParameter.CEILING_HEIGHTABOVELEVEL_PARAM).Set(offset)
+    missing = []
+    for name, value in values.items():
+        parameter = ceiling.LookupParameter(name)
+        if parameter is None or parameter.IsReadOnly or not _set_value(parameter, value):
+            missing.append(name)
+    return missing
+
+
+def ceiling_rings(doc, ceiling):
+    """Footprint of a ceiling as (x, y, z) rings, from its sketch (curves chained head to tail
+    first); its bbox on older Revit versions."""
+    sketch_id = getattr(ceiling, "SketchId", None)
+    sketch = doc.GetElement(sketch_id) if sketch_id is not None else None
+    if sketch is not None:
+        rings = []
+        for curve_array in sketch.Profile:
+            ring = []
+            for curve in chain_curves(list(curve_array)):
+                ring.extend(tessellate_curve(curve))
+            if len(ring) >= 3:
+                rings.append(ring)
+        if rings:
+            return rings
+    bb = ceiling.get_BoundingBox(None)
+    if bb is None:
+        return []
+    return [[(bb.Min.X, bb.Min.Y, 0.0), (bb.Max.X, bb.Min.Y, 0.0), (bb.Max.X, bb.Max.Y, 0.0), (bb.Min.X, bb.Max.Y, 0.0)]]
+
+
+class CeilingFootprints(object):
+    """Existing ceilings per level: a bbox grid, refined by point-in-polygon on the footprint.
+
+    Built once per run, for the given levels only (all levels when None).
+    """
+
+    def __init__(self, doc, level_ids=None):
+        self.rings = {}
+        boxes_by_level = {}
+        for ceiling in FilteredElementCollector(doc).OfCategory(BuiltInCategory.OST_Ceilings).WhereElementIsNotElementType():
+            level_id = ceiling.LevelId.IntegerValue
+            if level_ids is not None and level_id not in level_ids:
+                continue
+            rings = ceiling_rings(doc, ceiling)
+            if not rings:
+                continue
+            self.rings[ceiling.Id.IntegerValue] = rings
+            boxes_by_level.setdefault(level_id, []).append((ceiling.Id.IntegerValue, polygon_bbox(rings[0])))
+        self.grids = dict((level_id, GridIndex(boxes)) for level_id, boxes in boxes_by_level.items())
+
+    def __len__(self):
+        return len(self.rings)
+
+    def covering(self, level_id, x, y):
+        """Ids (int) of the ceilings on a level whose footprint holds (x, y)."""
+        grid = self.grids.get(getattr(level_id, "IntegerValue", level_id))
+        if grid is None:
+            return []
+        return [ceiling_id for ceiling_id in grid.query_point(x, y)
+                if point_to_rings_distance(x, y, self.rings[ceiling_id]) >= 0]
+
+    def covering_room(self, room, boundary_cache, label_points=None):
+        """Ids (int) of the ceilings over a room's interior point (its label point), taken
+        from label_points (RoomLabelPoints) when given so each room's is computed once."""
+        point = label_points.get(room) if label_points is not None else room_label_point(room, boundary_cache)
+        if point is None:
+            return []
+        return self.covering(room.LevelId, point.X, point.Y)
+
+
+def mark_covered(jobs, footprints, boundary_cache, replace=False, rooms=None):
+    """Skip (COVERED) the planned rooms that already have a ceiling, or queue that ceiling for replacement.
+
+    A ceiling is only replaced when every room under it is planned to get a new
+    one: pass as rooms every room of the run's levels (default: the jobs' rooms),
+    so a ceiling shared with a room left out of the run, or with an invalid
+    one, is kept and the rooms under it are skipped. Every job under a ceiling
+    lists it in replace_ids; create_ceilings deletes it once all of them succeeded.
+    Call it once for all the jobs of a run: a ceiling shared by rooms marked in
+    separate calls is never seen as fully planned.
+    """
+    label_points = RoomLabelPoints(boundary_cache)
+    covering = []
+    for job in jobs:
+        if job.status is None:
+            ceiling_ids = footprints.covering_room(job.room, boundary_cache, label_points)
+            if ceiling_ids:
+                covering.append((job, ceiling_ids))
+    if not replace:
+        for job, ceiling_ids in covering:
+            job.status = COVERED
+            job.detail = "ceiling {}".format(", ".join(str(i) for i in ceiling_ids))
+        return
+
+    # Ceilings also over a room that gets no new ceiling in this run
+    planned = set(job.room.Id.IntegerValue for job in jobs if job.status is None)
+    shared = set()
+    for room in rooms if rooms is not None else [job.room for job in jobs]:
+        if room.Id.IntegerValue not in planned:
+            shared.update(footprints.covering_room(room, boundary_cache, label_points))
+    for job, ceiling_ids in covering:
+        kept = [i for i in ceiling_ids if i in shared]
+        if kept:
+            job.status = COVERED
+            job.detail = "ceiling {} also covers rooms outside this run".format(", ".join(str(i) for i in kept))
+        else:
+            job.replace_ids = ceiling_ids
+
+
+class CeilingFailures(IFailuresPreprocessor):
+    """Drops warnings, and deletes the ceilings behind errors so the rest of the chunk commits.
+
+    Failing ceiling ids are kept in `rejected` with the failure description.
+    Errors not caused by a ceiling of this chunk roll the chunk back.
+    """
+
+    def __init__(self, ceiling_ids):
+        self.ceiling_ids = ceiling_ids
+        self.rejected = {}
+
+    def PreprocessFailures(self, failures_accessor):
+        for failure in failures_accessor.GetFailureMessages():
+            if failure.GetSeverity() == FailureSeverity.Warning:
+                failures_accessor.DeleteWarning(failure)
+                continue
+            failing_ids = [i for i in failure.GetFailingElementIds() if i.IntegerValue in self.ceiling_ids]
+            if not failing_ids:
+                return FailureProcessingResult.ProceedWithRollBack
+            for failing_id in failing_ids:
+                self.rejected[failing_id.IntegerValue] = failure.GetDescriptionText()
+            failures_accessor.DeleteElements(failing_ids)
+        return FailureProcessingResult.Continue
+
+
+def _create_chunk(doc, jobs, name):
+    """Create the ceilings of a chunk in one transaction; returns True if it committed."""
+    created = {}
+    failures = CeilingFailures(created)
+    with Transaction(doc, name) as t:
+        options = t.GetFailureHandlingOptions()
+        options.SetFailuresPreprocessor(failures)
+        t.SetFailureHandlingOptions(options)
+        t.Start()
+        for job in jobs:
+            ceiling = None
+            try:
+                ceiling = Ceiling.Create(doc, job.curve_loops, job.type_id, job.room.LevelId)
+                created[ceiling.Id.IntegerValue] = job
+                job.ceiling_id = ceiling.Id
+                # Offset and parameters in the same pass, no second loop over the new ceilings
+                missing = set_ceiling_values(ceiling, job.offset, job.values)
+                set_source_room(ceiling, job.room)
+                job.status = CREATED
+                job.detail = "not written: {}".format(", ".join(missing)) if missing else ""
+            except Exception as e:
+                if ceiling is not None:  # Created but not finished: drop it
+                    created.pop(ceiling.Id.IntegerValue, None)
+                    job.ceiling_id = None
+                    doc.Delete(ceiling.Id)
+                job.status, job.detail = FAILED, str(e)
+        committed = t.Commit() == TransactionStatus.Committed
+
+    for ceiling_id, detail in failures.rejected.items():
+        job = created[ceiling_id]
+        job.ceiling_id = None
+        job.status, job.detail = FAILED, detail
+    if not committed:
+        for job in jobs:
+            job.ceiling_id = None
+            if job.status == CREATED:
+                job.status, job.detail = FAILED, "transaction rolled back"
+    return committed
+
+
+def _delete_replaced(doc, jobs, name):
+    """Delete the ceilings queued by mark_covered whose every room got its new ceiling.
+
+    Runs after the creation chunks, so a ceiling the failures preprocessor
+    rejected never costs the room its old one. Each replaced ceiling is deleted
+    once, however many rooms it was over. Jobs keep in replace_ids only the
+    ceilings actually deleted.
+    """
+    jobs_by_ceiling = {}
+    for job in jobs:
+        for ceiling_id in job.replace_ids:
+            jobs_by_ceiling.setdefault(ceiling_id, []).append(job)
+    doomed = sorted(ceiling_id for ceiling_id, owners in jobs_by_ceiling.items()
+                    if all(job.status == CREATED for job in owners))
+    deleted = set()
+    if doomed:
+        with Transaction(doc, name) as t:
+            t.Start()
+            for ceiling_id in doomed:
+                try:
+                    doc.Delete(ElementId(ceiling_id))
+                    deleted.add(ceiling_id)
+                except Exception:
+                    pass  # Already gone (e.g. deleted with another element); nothing left to replace
+            if t.Commit() != TransactionStatus.Committed:
+                deleted.clear()
+    for job in jobs:
+        if not job.replace_ids:
+            continue
+        kept = [ceiling_id for ceiling_id in job.replace_ids if ceiling_id not in deleted]
+        job.replace_ids = [ceiling_id for ceiling_id in job.replace_ids if ceiling_id in deleted]
+        if kept and job.status == CREATED:
+            note = "old ceiling {} kept, a room under it got no new ceiling".format(", ".join(str(i) for i in kept))
+            job.detail = "{}; {}".format(job.detail, note) if job.detail else note
+
+
+def create_ceilings(doc, jobs, chunk_size=CEILINGS_PER_TRANSACTION, name="Create ceilings"):
+    """Create the ceilings of the valid jobs, chunk_size per transaction, as one undo step.
+
+    A chunk Revit rolls back as a whole is retried one ceiling per transaction,
+    so only the bad rooms end up FAILED. Ceilings being replaced are deleted
+    last, see _delete_replaced. Returns the elapsed time in seconds.
+    """
+    pending = [job for job in jobs if job.status is None]
+    start = time.time()
+    with TransactionGroup(doc, name) as tg:
+        tg.Start()
+        for first in range(0, len(pending), chunk_size):
+            chunk = pending[first:first + chunk_size]
+            if not _create_chunk(doc, chunk, "{} ({}-{})".format(name, first + 1, first + len(chunk))):
+                for job in chunk:
+                    _create_chunk(doc, [job], name)
+        _delete_replaced(doc, jobs, "{} (remove replaced)".format(name))
+        tg.Assimilate()
+    return time.time() - start
+
+
+def print_ceiling_report(jobs, elapsed):
+    """Per-room outcomes of the rooms that did not get a ceiling, then totals and throughput."""
+    counts = {}
+    for job in jobs:
+        counts[job.status] = counts.get(job.status, 0) + 1
+        if job.status == COVERED:
+            continue  # expected on reruns, only counted
+        if job.status != CREATED or job.detail:
+            print("{}: {} - {}".format(job.status.upper(), job.label, job.detail))
+    created = counts.get(CREATED, 0)
+    replaced = len([job for job in jobs if job.status == CREATED and job.replace_ids])
+    print("Ceilings created: {} ({} replacing an existing one), already covered: {}, invalid boundaries: {}, "
+          "no rule: {}, failed: {}".format(created, replaced, counts.get(COVERED, 0), counts.get(INVALID, 0),
+                                           counts.get(NO_RULE, 0), counts.get(FAILED, 0)))
+    print("Elapsed: {:.1f} s ({:.1f} ceilings/s)".format(elapsed, created / elapsed if elapsed > 0 else 0))
@@ -0,0 +1,494 @@
+"""Pure-Python 2D geometry helpers (no Revit API imports).
+
+Works under both IronPython 2.7 and pyRevit's CPython engine.
+"""
+
+import heapq
+import math
+from array import array
+
+try:
+    import numpy as np
+except ImportError:  # IronPython
+    np = None
+
+try:
+    xrange
+except NameError:  # CPython 3
+    xrange = range
+
+
+def polygon_bbox(vertices):
+    """Return (min_x, min_y, max_x, max_y) of a list of (x, y[, z]) vertices."""
+    xs = [v[0] for v in vertices]
+    ys = [v[1] for v in vertices]
+    return (min(xs), min(ys), max(xs), max(ys))
+
+
+def arc_segment_count(radius, angle, chord_tolerance, max_segments):
+    """Number of chords needed so an arc deviates from them by at most chord_tolerance."""
+    if radius <= chord_tolerance:
+        return 1 if angle <= math.pi else 2
+    step = 2.0 * math.acos(1.0 - chord_tolerance / radius)
+    return max(1, min(max_segments, int(math.ceil(abs(angle) / step))))
+
+
+def simplify_polyline(points, tolerance):
+    """Douglas-Peucker: drop vertices closer than tolerance to the simplified polyline.
+
+    Keeps the first and last point; points are (x, y[, z]) tuples.
+    """
+    if len(points) < 3:
+        return list(points)
+    keep = [False] * len(points)
+    keep[0] = keep[-1] = True
+    stack = [(0, len(points) - 1)]
+    tol_sq = tolerance * tolerance
+    while stack:
+        first, last = stack.pop()
+        ax, ay = points[first][0], points[first][1]
+        dx = points[last][0] - ax
+        dy = points[last][1] - ay
+        length_sq = dx * dx + dy * dy
+        worst, worst_dist_sq = None, tol_sq
+        for k in xrange(first + 1, last):
+            rx = points[k][0] - ax
+            ry = points[k][1] - ay
+            if length_sq > 0:
+                cross = rx * dy - ry * dx
+                dist_sq = cross * cross / length_sq
+            else:
+                dist_sq = rx * rx + ry * ry
+            if dist_sq > worst_dist_sq:
+                worst, worst_dist_sq = k, dist_sq
+        if worst is not None:
+            keep[worst] = True
+            stack.append((first, worst))
+            stack.append((worst, last))
+    return [p for p, kept in zip(points, keep) if kept]
+
+
+def polygon_area(vertices):
+    """Signed area of a polygon of (x, y[, z]) vertices, positive when counter-clockwise."""
+    area2 = 0.0
+    count = len(vertices)
+    for k in xrange(count):
+        ax, ay = vertices[k][0], vertices[k][1]
+        bx, by = vertices[(k + 1) % count][0], vertices[(k + 1) % count][1]
+        area2 += ax * by - bx * ay
+    return area2 / 2.0
+
+
+def polygon_centroid(vertices):
+    """Area centroid of a polygon of (x, y[, z]) vertices; the vertex mean if it has no area."""
+    area2 = cx = cy = 0.0
+    count = len(vertices)
+    for k in xrange(count):
+        ax, ay = vertices[k][0], vertices[k][1]
+        bx, by = vertices[(k + 1) % count][0], vertices[(k + 1) % count][1]
+        cross = ax * by - bx * ay
+        area2 += cross
+        cx += (ax + bx) * cross
+        cy += (ay + by) * cross
+    if area2 == 0:
+        return (sum(v[0] for v in vertices) / count, sum(v[1] for v in vertices) / count)
+    return (cx / (3.0 * area2), cy / (3.0 * area2))
+
+
+def point_to_rings_distance(px, py, rings):
+    """Signed distance from (px, py) to the nearest edge of the rings.
+
+    Positive inside, negative outside; inside uses the even-odd rule, so the
+    loops after the outer one act as holes.
+    """
+    inside = False
+    min_dist_sq = float("inf")
+    for ring in rings:
+        count = len(ring)
+        bx, by = ring[-1][0], ring[-1][1]
+        for k in xrange(count):
+            ax, ay = ring[k][0], ring[k][1]
+            if (ay > py) != (by > py) and px < (bx - ax) * (py - ay) / (by - ay) + ax:
+                inside = not inside
+            dx = bx - ax
+            dy = by - ay
+            rx = px - ax
+            ry = py - ay
+            length_sq = dx * dx + dy * dy
+            t = (rx * dx + ry * dy) / length_sq if length_sq > 0 else 0.0
+            if t < 0.0:
+                t = 0.0
+            elif t > 1.0:
+                t = 1.0
+            ex = t * dx - rx
+            ey = t * dy - ry
+            dist_sq = ex * ex + ey * ey
+            if dist_sq < min_dist_sq:
+                min_dist_sq = dist_sq
+            bx, by = ax, ay
+    distance = math.sqrt(min_dist_sq)
+    return distance if inside else -distance
+
+
+def polylabel(rings, precision=1.0):
+    """Pole of inaccessibility: the interior point farthest from every edge.
+
+    Grid cells over the outer ring's bbox are refined best-first, keyed by the
+    largest distance any point of the cell could reach, until no cell can beat
+    the best point found by more than precision (same units as the vertices).
+    The centroid and bbox centre are tried first, so convex rooms stay centred.
+
+    :param rings:       vertex lists [(x, y[, z]), ...], outer ring first, holes after
+    :param precision:   stop once no improvement larger than this is possible
+    :return:            (x, y, distance to the nearest edge)
+    """
+    min_x, min_y, max_x, max_y = polygon_bbox(rings[0])
+    width = max_x - min_x
+    height = max_y - min_y
+    cell_size = min(width, height)
+    if cell_size <= 0:
+        return (min_x, min_y, 0.0)
+
+    queue = []
+
+    def push(cx, cy, half):
+        distance = point_to_rings_distance(cx, cy, rings)
+        heapq.heappush(queue, (-(distance + half * math.sqrt(2)), cx, cy, half, distance))
+
+    half = cell_size / 2.0
+    x = min_x
+    while x < max_x:
+        y = min_y
+        while y < max_y:
+            push(x + half, y + half, half)
+            y += cell_size
+        x += cell_size
+
+    best_x, best_y = polygon_centroid(rings[0])
+    best_distance = point_to_rings_distance(best_x, best_y, rings)
+    center_x = min_x + width / 2.0
+    center_y = min_y + height / 2.0
+    center_distance = point_to_rings_distance(center_x, center_y, rings)
+    if center_distance > best_distance:
+        best_x, best_y, best_distance = center_x, center_y, center_distance
+
+    while queue:
+        neg_potential, cx, cy, half, distance = heapq.heappop(queue)
+        if distance > best_distance:
+            best_x, best_y, best_distance = cx, cy, distance
+        # Cells come out by decreasing potential, none left can improve enough
+        if -neg_potential - best_distance <= precision:
+            break
+        half /= 2.0
+        push(cx - half, cy - half, half)
+        push(cx + half, cy - half, half)
+        push(cx - half, cy + half, half)
+        push(cx + half, cy + half, half)
+    return (best_x, best_y, best_distance)
+
+
+class GridIndex(object):
+    """Uniform grid over axis-aligned bounding boxes (a spatial hash).
+
+    Built from (key, bbox) pairs; `query_point` / `query_box` then return only
+    the keys whose bbox contains the point / overlaps the box, instead of every
+    key in the index. Boxes can be added and removed as they move.
+    """
+
+    def __init__(self, items, cell_size=None):
+        """
+        :param items:       iterable of (key, (min_x, min_y, max_x, max_y))
+        :param cell_size:   grid cell size in internal units (feet). Defaults to
+                            the mean bbox extent, so each bbox spans a few cells.
+        """
+        boxes = dict(items)
+        if cell_size is None:
+            extents = [max(b[2] - b[0], b[3] - b[1]) for b in boxes.values()]
+            cell_size = (sum(extents) / len(extents)) if extents else 1.0
+        self.cell_size = cell_size if cell_size > 0 else 1.0
+        self.boxes = {}
+        self.cells = {}
+        for key, box in boxes.items():
+            self.insert(key, box)
+
+    def __len__(self):
+        return len(self.boxes)
+
+    def _cell(self, x, y):
+        return (int(x // self.cell_size), int(y // self.cell_size))
+
+    def _cells_of(self, box):
+        min_i, min_j = self._cell(box[0], box[1])
+        max_i, max_j = self._cell(box[2], box[3])
+        for i in range(min_i, max_i + 1):
+            for j in range(min_j, max_j + 1):
+                yield (i, j)
+
+    def insert(self, key, box):
+        """Add (or move) a key with bbox (min_x, min_y, max_x, max_y)."""
+        if key in self.boxes:
+            self.remove(key)
+        self.boxes[key] = box
+        for cell in self._cells_of(box):
+            self.cells.setdefault(cell, []).append(key)
+
+    def remove(self, key):
+        box = self.boxes.pop(key)
+        for cell in self._cells_of(box):
+            self.cells[cell].remove(key)
+
+    def query_box(self, box, exclude=None):
+        """Return the keys (other than exclude) whose bbox overlaps box."""
+        min_x, min_y, max_x, max_y = box
+        found = []
+        seen = set([exclude])
+        for cell in self._cells_of(box):
+            for key in self.cells.get(cell, ()):
+                if key in seen:
+                    continue
+                seen.add(key)
+                other = self.boxes[key]
+                if other[0] < max_x and min_x < other[2] and other[1] < max_y and min_y < other[3]:
+                    found.append(key)
+        return found
+
+    def query_point(self, x, y, tolerance=0.0):
+        """Return the keys whose bbox (grown by tolerance) contains (x, y)."""
+        min_i, min_j = self._cell(x - tolerance, y - tolerance)
+        max_i, max_j = self._cell(x + tolerance, y + tolerance)
+        candidates = []
+        seen = set()
+        for i in range(min_i, max_i + 1):
+            for j in range(min_j, max_j + 1):
+                for key in self.cells.get((i, j), ()):
+                    if key in seen:
+                        continue
+                    seen.add(key)
+                    min_x, min_y, max_x, max_y = self.boxes[key]
+                    if min_x - tolerance <= x <= max_x + tolerance and min_y - tolerance <= y <= max_y + tolerance:
+                        candidates.append(key)
+        return candidates
+
+
+def interior_grid_points(rings, spacing, origin, limit=None):
+    """Points of a grid through origin, spaced by spacing, that lie inside the rings.
+
+    Sorted by distance from origin, nearest first, at most limit of them; used
+    to look for free spots inside a room near where something currently sits.
+    Square rings of grid points are walked outward from origin, and the walk
+    stops once limit points are found that no farther ring can beat, so only
+    the neighbourhood of origin is tested, not the whole room.
+    """
+    if spacing <= 0:
+        return []
+    min_x, min_y, max_x, max_y = polygon_bbox(rings[0])
+    ox, oy = origin[0], origin[1]
+    min_i = int(math.floor((min_x - ox) / spacing))
+    max_i = int(math.ceil((max_x - ox) / spacing))
+    min_j = int(math.floor((min_y - oy) / spacing))
+    max_j = int(math.ceil((max_y - oy) / spacing))
+
+    points = []
+
+    def visit(i, j):
+        x = ox + i * spacing
+        y = oy + j * spacing
+        if point_to_rings_distance(x, y, rings) > 0:
+            points.append((i * i + j * j, x, y))
+
+    for k in xrange(1, max(-min_i, max_i, -min_j, max_j, 0) + 1):
+        # Ring k: every grid point with max(|i|, |j|) == k, clipped to the bbox
+        for i in xrange(max(-k, min_i), min(k, max_i) + 1):
+            if min_j <= -k:
+                visit(i, -k)
+            if k <= max_j:
+                visit(i, k)
+        for j in xrange(max(1 - k, min_j), min(k - 1, max_j) + 1):
+            if min_i <= -k:
+                visit(-k, j)
+            if k <= max_i:
+                visit(k, j)
+        # Points of later rings are at least k + 1 steps away
+        if limit is not None and len(points) >= limit:
+            points.sort()
+            if points[limit - 1][0] < (k + 1) * (k + 1):
+                break
+    points.sort()
+    return [(x, y) for _, x, y in points[:limit]]
+
+
+class CompiledPolygon(object):
+    """A polygon prepared for repeated containment tests.
+
+    Keeps its bbox and, per edge, the start point, the delta to the next vertex
+    and the inverse squared length (0 for zero-length edges), all in array('d')
+    storage, so `contains` runs without per-edge tuple unpacking or allocation.
+    """
+    __slots__ = ("count", "min_x", "min_y", "max_x", "max_y", "x0", "y0", "dx", "dy", "inv_length_sq")
+
+    def __init__(self, vertices):
+        """
+        :param vertices:    list of (x, y[, z]) vertices, open or closed
+        """
+        self.count = len(vertices)
+        self.x0 = array('d', [v[0] for v in vertices])
+        self.y0 = array('d', [v[1] for v in vertices])
+        self.dx = array('d')
+        self.dy = array('d')
+        self.inv_length_sq = array('d')
+        for k in xrange(self.count):
+            next_k = (k + 1) % self.count
+            dx = self.x0[next_k] - self.x0[k]
+            dy = self.y0[next_k] - self.y0[k]
+            length_sq = dx * dx + dy * dy
+            self.dx.append(dx)
+            self.dy.append(dy)
+            self.inv_length_sq.append(1.0 / length_sq if length_sq > 0 else 0.0)
+        if self.count:
+            self.min_x, self.min_y, self.max_x, self.max_y = polygon_bbox(vertices)
+        else:
+            self.min_x = self.min_y = self.max_x = self.max_y = 0.0
+
+    def __len__(self):
+        return self.count
+
+    @property
+    def bbox(self):
+        return (self.min_x, self.min_y, self.max_x, self.max_y)
+
+    def contains(self, px, py, tolerance=1e-6):
+        """True when (px, py) is within tolerance of an edge or the polygon winds once around it."""
+        if (not self.count or px < self.min_x - tolerance or px > self.max_x + tolerance
+                or py < self.min_y - tolerance or py > self.max_y + tolerance):
+            return False
+        tol_sq = tolerance * tolerance
+        x0s, y0s, dxs, dys, inv = self.x0, self.y0, self.dx, self.dy, self.inv_length_sq
+        winding = 0
+        for k in xrange(self.count):
+            x0 = x0s[k]
+            y0 = y0s[k]
+            dx = dxs[k]
+            dy = dys[k]
+            rx = px - x0
+            ry = py - y0
+            t = (rx * dx + ry * dy) * inv[k]
+            if t < 0.0:
+                t = 0.0
+            elif t > 1.0:
+                t = 1.0
+            ex = t * dx - rx
+            ey = t * dy - ry
+            if ex * ex + ey * ey <= tol_sq:
+                return True
+            if y0 <= py:
+                if y0 + dy > py and dx * ry - rx * dy > 0:
+                    winding += 1
+            elif y0 + dy <= py and dx * ry - rx * dy < 0:
+                winding -= 1
+        return winding == 1 or winding == -1
+
+
+class PackedPolygons(object):
+    """A set of M compiled polygons answering containment for N points at once.
+
+    A point counts as inside a polygon when it lies within `tolerance` of one of
+    its edges, or when the polygon winds exactly once around it (the same rule
+    as the kitchen matcher's original PointInPoly.polygon_contains, kept in
+    tests/baseline_pip.py and fuzzed against in tests/test_geometry.py).
+
+    Runs on NumPy when it can be imported (pyRevit CPython engine) and on
+    CompiledPolygon.contains otherwise (IronPython).
+    """
+
+    def __init__(self, polygons, ids=None, use_numpy=None):
+        """
+        :param polygons:    list of vertex lists [(x, y[, z]), ...] or CompiledPolygons
+        :param ids:         optional list of keys returned by `locate`;
+                            defaults to the polygon positions 0..M-1
+        :param use_numpy:   force the NumPy (True) or pure-Python (False) kernel
+        """
+        self.ids = list(ids) if ids is not None else list(range(len(polygons)))
+        self.polygons = [p if isinstance(p, CompiledPolygon) else CompiledPolygon(p) for p in polygons]
+        self.grid = GridIndex((j, p.bbox) for j, p in enumerate(self.polygons) if p.count)
+        self.use_numpy = (np is not None) if use_numpy is None else (use_numpy and np is not None)
+
+    def __len__(self):
+        return len(self.ids)
+
+    def locate(self, points, tolerance=1e-6):
+        """Return, for each of the N points, the list of ids of the polygons containing it."""
+        candidates = self._candidates(points, tolerance)
+        if self.use_numpy:
+            hits = self._locate_numpy(points, candidates, tolerance)
+        else:
+            hits = self._locate_python(points, candidates, tolerance)
+        ids = self.ids
+        return [[ids[j] for j in polygon_indices] for polygon_indices in hits]
+
+    def contains_matrix(self, points, tolerance=1e-6):
+        """Return an N x M list of booleans; row i, column j is point i in polygon j."""
+        positions = dict((key, j) for j, key in enumerate(self.ids))
+        matrix = []
+        for polygon_ids in self.locate(points, tolerance):
+            row = [False] * len(self.ids)
+            for key in polygon_ids:
+                row[positions[key]] = True
+            matrix.append(row)
+        return matrix
+
+    def _candidates(self, points, tolerance):
+        query = self.grid.query_point
+        return [query(p[0], p[1], tolerance) for p in points]
+
+    def _locate_python(self, points, candidates, tolerance):
+        polygons = self.polygons
+        hits = []
+        for p, polygon_indices in zip(points, candidates):
+            px = p[0]
+            py = p[1]
+            hits.append([j for j in polygon_indices if polygons[j].contains(px, py, tolerance)])
+        return hits
+
+    def _locate_numpy(self, points, candidates, tolerance):
+        # Invert point -> candidate polygons into polygon -> candidate points, then
+        # test every candidate point of one polygon against all its edges at once.
+        points_by_polygon = {}
+        for i, polygon_indices in enumerate(candidates):
+            for j in polygon_indices:
+                points_by_polygon.setdefault(j, []).append(i)
+
+        all_x = np.array([p[0] for p in points], dtype=float)
+        all_y = np.array([p[1] for p in points], dtype=float)
+        tol_sq = tolerance * tolerance
+
+        hits = [[] for _ in points]
+        for j in sorted(points_by_polygon):
+            polygon = self.polygons[j]
+            point_indices = np.array(points_by_polygon[j])
+            px = all_x[point_indices][:, None]
+            py = all_y[point_indices][:, None]
+            x0 = np.frombuffer(polygon.x0, dtype=float)
+            y0 = np.frombuffer(polygon.y0, dtype=float)
+            dx = np.frombuffer(polygon.dx, dtype=float)
+            dy = np.frombuffer(polygon.dy, dtype=float)
+            inv = np.frombuffer(polygon.inv_length_sq, dtype=float)
+
+            # Distance from each point to each edge, projection clamped to the segment
+            rx = px - x0
+            ry = py - y0
+            t = np.clip((rx * dx + ry * dy) * inv, 0.0, 1.0)
+            ex = t * dx - rx
+            ey = t * dy - ry
+            near_edge = ((ex * ex + ey * ey) <= tol_sq).any(axis=1)
+
+            # Winding number: signed count of upward/downward crossings left of the point
+            is_left = dx * ry - rx * dy
+            y1 = y0 + dy
+            up = (y0 <= py) & (y1 > py) & (is_left > 0)
+            down = (y0 > py) & (y1 <= py) & (is_left < 0)
+            winding = up.sum(axis=1) - down.sum(axis=1)
+
+            inside = near_edge | (np.abs(winding) == 1)
+            for i in point_indices[inside]:
+                hits[int(i)].append(j)
+        return hits
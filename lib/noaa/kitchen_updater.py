@@ -0,0 +1,249 @@
+"""Dynamic model updater keeping 'Kitchen Type' current between button runs.
+
+Repeats the last classification IdentifyGroupsForKitchens stored in the model
+(fixture names, match mode and linked models, see
+noaa.kitchens.save_kitchen_settings), but only for what a change batch touches:
+
+- group mode: every group type owning a changed fixture, area or group; all
+  instances of such a type are re-evaluated together, as the button does
+- area mode: every level holding a changed fixture or area (and the level a
+  changed or deleted fixture was last seen on; the updater seeds those levels
+  for every configured fixture the first time it runs on a document)
+
+Areas that no longer hold a kitchen get their 'Kitchen Type' cleared, but only
+if the current value is one of the configured fixture names.
+"""
+
+from Autodesk.Revit.DB import (BuiltInCategory, BuiltInParameter, ChangePriority, Element, ElementCategoryFilter,
+                               ElementId, ElementLevelFilter, FilteredElementCollector, Group)
+from System import Guid
+
+from noaa.apartments import ApartmentCatalogue
+from noaa.boundaries import get_boundary_cache
+from noaa.kitchens import (KITCHEN_TYPE_PARAMETER, MATCH_BY_AREAS, build_area_index, collect_link_fixture_points,
+                           load_kitchen_settings, locate_fixture_areas, set_kitchen_types)
+from noaa.updaters import ModelUpdater, get_logger, register_updater
+
+UPDATER_GUID = Guid("6f1c2d4e-8a3b-4c5d-9e7f-0a1b2c3d4e5f")
+
+FIXTURES = int(BuiltInCategory.OST_PlumbingFixtures)
+AREAS = int(BuiltInCategory.OST_Areas)
+
+
+def _category_id(element):
+    return element.Category.Id.IntegerValue if element.Category else None
+
+
+def _pick_kitchen_type(found_names, fixture_names):
+    """Last configured name present wins, matching the button's precedence."""
+    kitchen_type = ""
+    for name in fixture_names:
+        if name in found_names:
+            kitchen_type = name
+    return kitchen_type
+
+
+def _retarget(area, kitchen_type, fixture_names, kitchen_types):
+    """Queue a value for an area; clearing only touches values this tool wrote."""
+    if kitchen_type:
+        kitchen_types[area.Id.IntegerValue] = kitchen_type
+        return
+    parameter = area.LookupParameter(KITCHEN_TYPE_PARAMETER)
+    if parameter and parameter.AsString() in fixture_names:
+        kitchen_types[area.Id.IntegerValue] = ""
+
+
+def affected_scope(doc, changed_ids, deleted_ids, match_mode, fixture_levels):
+    """Return the integer ids of the group types (group mode) or levels (area mode) to recompute.
+
+    :param fixture_levels:  {fixture id (int): level id (int)} last seen, updated in place
+    """
+    scope = set()
+    for element_id in changed_ids:
+        element = doc.GetElement(element_id)
+        if element is None:
+            continue
+        category_id = _category_id(element)
+        if match_mode == MATCH_BY_AREAS:
+            if category_id == FIXTURES:
+                previous_level = fixture_levels.get(element_id.IntegerValue)
+                if previous_level is not None:
+                    scope.add(previous_level)
+                fixture_levels[element_id.IntegerValue] = element.LevelId.IntegerValue
+            if category_id in (FIXTURES, AREAS):
+                scope.add(element.LevelId.IntegerValue)
+        elif isinstance(element, Group):
+            scope.add(element.GetTypeId().IntegerValue)
+        elif category_id in (FIXTURES, AREAS) and element.GroupId.IntegerValue != -1:
+            scope.add(doc.GetElement(element.GroupId).GetTypeId().IntegerValue)
+
+    if match_mode == MATCH_BY_AREAS:
+        for element_id in deleted_ids:
+            previous_level = fixture_levels.pop(element_id.IntegerValue, None)
+            if previous_level is not None:
+                scope.add(previous_level)
+    return scope
+
+
+def seed_fixture_levels(doc, fixture_names):
+    """{fixture id (int): level id (int)} of every configured fixture in the model."""
+    return dict((f.Id.IntegerValue, f.LevelId.IntegerValue)
+                for f in FilteredElementCollector(doc).OfCategory(BuiltInCategory.OST_PlumbingFixtures)
+                .WhereElementIsNotElementType() if f.Name in fixture_names)
+
+
+def marked_levels(doc, fixture_names):
+    """Integer ids of the levels holding an area whose 'Kitchen Type' is one of the configured names."""
+    levels = set()
+    for area in FilteredElementCollector(doc).OfCategory(BuiltInCategory.OST_Areas).WhereElementIsNotElementType():
+        parameter = area.LookupParameter(KITCHEN_TYPE_PARAMETER)
+        if parameter and parameter.AsString() in fixture_names:
+            levels.add(area.LevelId.IntegerValue)
+    return levels
+
+
+def recompute_group_types(doc, group_type_ids, fixture_names):
+    """Kitchen types for every area in every instance of the given group types."""
+    kitchen_types = {}
+    for type_id in group_type_ids:
+        group_type = doc.GetElement(ElementId(type_id))
+        if group_type is None:
+            continue
+        found_names = set()
+        areas = []
+        numbered = False
+        for group in group_type.Groups:
+            for member_id in group.GetMemberIds():
+                member = doc.GetElement(member_id)
+                category_id = _category_id(member)
+                if category_id == FIXTURES and member.Name in fixture_names:
+                    found_names.add(member.Name)
+                elif category_id == AREAS:
+                    areas.append(member)
+                    number = member.LookupParameter('Number')
+                    if number and number.AsString() and len(number.AsString()) <= 8:
+                        numbered = True
+        kitchen_type = _pick_kitchen_type(found_names, fixture_names) if numbered else ""
+        for area in areas:
+            _retarget(area, kitchen_type, fixture_names, kitchen_types)
+    return kitchen_types
+
+
+def recompute_levels(doc, level_ids, fixture_names, fixture_levels, tolerance=1e-6, missing=None, link_points=None,
+                     clear=True):
+    """Kitchen types for every apartment on the given levels (area mode).
+
+    link_points adds linked fixtures as collect_link_fixture_points returns them,
+    so areas holding only a linked kitchen keep their value; with clear=False no
+    value is cleared at all. Areas skipped for lack of a boundary are appended
+    to missing, when given.
+    """
+    kitchen_types = {}
+    for level_id in level_ids:
+        level_filter = ElementLevelFilter(ElementId(level_id))
+        catalogue = ApartmentCatalogue(FilteredElementCollector(doc).OfCategory(BuiltInCategory.OST_Areas)
+                                       .WhereElementIsNotElementType().WherePasses(level_filter))
+        area_index = build_area_index(doc, catalogue, missing=missing)
+        fixtures = [f for f in FilteredElementCollector(doc).OfCategory(BuiltInCategory.OST_PlumbingFixtures)
+                    .WhereElementIsNotElementType().WherePasses(level_filter) if f.Name in fixture_names]
+        for fixture in fixtures:
+            fixture_levels[fixture.Id.IntegerValue] = level_id
+
+        found_names = {}
+        for name in fixture_names:
+            extra_points = (link_points or {}).get(name)
+            for area_ids in locate_fixture_areas([f for f in fixtures if f.Name == name], area_index, tolerance,
+                                                 extra_points).values():
+                for area_id in area_ids:
+                    found_names.setdefault(area_id.IntegerValue, set()).add(name)
+        for apartment in catalogue.on_level(level_id):
+            kitchen_type = _pick_kitchen_type(found_names.get(apartment.area_id, ()), fixture_names)
+            if kitchen_type or clear:
+                _retarget(apartment.area, kitchen_type, fixture_names, kitchen_types)
+    return kitchen_types
+
+
+def update_kitchen_types(doc, changed_ids, deleted_ids, fixture_names, match_mode, fixture_levels, extra_scope=(),
+                         link_instances=()):
+    """Recompute and write 'Kitchen Type' for the scope of one change batch.
+
+    extra_scope adds group type / level ids (int) to recompute regardless of the changes.
+    In area mode, fixtures of link_instances (RevitLinkInstances) count as well.
+    Returns the number of areas whose value changed.
+    """
+    get_boundary_cache(doc).invalidate(list(changed_ids) + list(deleted_ids))
+    scope = affected_scope(doc, changed_ids, deleted_ids, match_mode, fixture_levels) | set(extra_scope)
+    if not scope:
+        return 0
+    if match_mode == MATCH_BY_AREAS:
+        missing = []
+        unloaded = []
+        # Cached per link version, so only the first batch after a (re)load reads the link
+        link_points = None
+        if link_instances:
+            link_points = collect_link_fixture_points(doc, link_instances, fixture_names, unloaded=unloaded)
+        if unloaded:
+            get_logger(__name__).warning("Kitchen Type: links not loaded, values kept where a kitchen may be linked: {}".format(
+                ", ".join(unloaded)))
+        # With a link unloaded its kitchens cannot be seen, so nothing is cleared
+        kitchen_types = recompute_levels(doc, scope, fixture_names, fixture_levels, missing=missing,
+                                         link_points=link_points, clear=not unloaded)
+        if missing:
+            get_logger(__name__).warning("Kitchen Type: areas without a boundary left as they are: {}".format(
+                ", ".join(str(area_id) for area_id in missing)))
+    else:
+        kitchen_types = recompute_group_types(doc, scope, fixture_names)
+    return set_kitchen_types(doc, kitchen_types)
+
+
+class KitchenTypeUpdater(ModelUpdater):
+    """Model updater around update_kitchen_types."""
+    UPDATER_GUID = UPDATER_GUID
+    NAME = "NOAA Kitchen Type"
+    INFORMATION = "Keeps the 'Kitchen Type' area parameter in sync with plumbing fixtures, model groups and areas."
+    PRIORITY = ChangePriority.RoomsSpacesZones
+
+    def __init__(self, addin_id):
+        ModelUpdater.__init__(self, addin_id)
+        self.fixture_levels = {}    # document hash -> (fixture names, {fixture id: level id})
+
+    def run(self, data):
+        doc = data.GetDocument()
+        fixture_names, match_mode, link_instances = load_kitchen_settings(doc)
+        if not fixture_names or not match_mode:
+            return
+        changed_ids = list(data.GetAddedElementIds()) + list(data.GetModifiedElementIds())
+        deleted_ids = list(data.GetDeletedElementIds())
+        extra_scope = ()
+        seeded_names, fixture_levels = self.fixture_levels.get(doc.GetHashCode(), (None, None))
+        if seeded_names != fixture_names:
+            # First change seen in this document (or new settings): learn where every
+            # configured fixture sits, so later deletions know which level they leave
+            fixture_levels = seed_fixture_levels(doc, fixture_names)
+            self.fixture_levels[doc.GetHashCode()] = (fixture_names, fixture_levels)
+            if match_mode == MATCH_BY_AREAS:
+                # Where fixtures deleted or moved by this very change used to be is unknown:
+                # recheck every level with a kitchen, once
+                extra_scope = marked_levels(doc, fixture_names)
+        update_kitchen_types(doc, changed_ids, deleted_ids, fixture_names, match_mode, fixture_levels, extra_scope,
+                             link_instances)
+
+    def triggers(self):
+        triggers = []
+        any_change = [Element.GetChangeTypeAny(), Element.GetChangeTypeElementAddition(),
+                      Element.GetChangeTypeElementDeletion()]
+        for category in (BuiltInCategory.OST_PlumbingFixtures, BuiltInCategory.OST_IOSModelGroups):
+            for change_type in any_change:
+                triggers.append((ElementCategoryFilter(category), change_type))
+
+        # Areas: not on any parameter change, or our own 'Kitchen Type' writes would re-trigger us
+        area_filter = ElementCategoryFilter(BuiltInCategory.OST_Areas)
+        triggers.append((area_filter, Element.GetChangeTypeGeometry()))
+        triggers.append((area_filter, Element.GetChangeTypeElementAddition()))
+        triggers.append((area_filter, Element.GetChangeTypeParameter(ElementId(BuiltInParameter.ROOM_NUMBER))))
+        return triggers
+
+
+def register_kitchen_updater(addin_id):
+    """Register the updater and its triggers once per Revit session."""
+    return register_updater(KitchenTypeUpdater(addin_id))
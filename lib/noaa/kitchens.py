@@ -0,0 +1,347 @@
+"""Fixture -> group -> area logic behind 'Kitchen Type'.
+
+Shared by the IdentifyGroupsForKitchens button (whole model) and the kitchen
+updater (only the apartments touched by a change). Nothing in here opens a
+transaction; callers decide how the writes are wrapped.
+"""
+
+from bisect import bisect_right
+
+import clr
+from Autodesk.Revit.DB import (BuiltInCategory, Document, ElementId, FilteredElementCollector, Group, GroupType, Level,
+                               StorageType)
+from Autodesk.Revit.DB.ExtensibleStorage import (AccessLevel, DataStorage, Entity, ExtensibleStorageFilter, Schema,
+                                                SchemaBuilder)
+from System import Guid, String
+from System.Collections.Generic import IList, List
+
+from noaa.apartments import ApartmentCatalogue
+from noaa.boundaries import get_boundary_cache
+from noaa.geometry import PackedPolygons
+
+MATCH_BY_GROUPS = "Groups (fixture and area in the same group)"
+MATCH_BY_AREAS = "Areas (fixture located inside the area)"
+
+KITCHEN_TYPE_PARAMETER = "Kitchen Type"
+
+# Extensible storage on a DataStorage element of its own: the last classification, repeated by the kitchen updater
+SETTINGS_SCHEMA_GUID = Guid("c2e5a7d9-1f3b-4a6c-8e0d-5b9f2c4a7e13")
+SETTINGS_FIXTURE_NAMES = "FixtureNames"
+SETTINGS_MATCH_MODE = "MatchMode"
+SETTINGS_LINK_IDS = "LinkInstanceIds"
+
+
+def collect_fixtures_by_name(doc, selected_names):
+    """Bucket the plumbing fixtures of the selected families in a single pass."""
+    fixtures_by_name = dict((name, []) for name in selected_names)
+    collector = FilteredElementCollector(doc).OfCategory(BuiltInCategory.OST_PlumbingFixtures).WhereElementIsNotElementType()
+    for f in collector:
+        bucket = fixtures_by_name.get(f.Name)
+        if bucket is not None:
+            bucket.append(f)
+    return fixtures_by_name
+
+
+class GroupAreaIndex(object):
+    """Model groups and their member areas, keyed by integer Group / GroupType ids.
+
+    Built from one Group collector and Group.GetMemberIds(), so no per-area
+    GetElement call is needed to know which group instance holds an area.
+    """
+
+    def __init__(self, doc, areas):
+        areas_by_id = dict((area.Id.IntegerValue, area) for area in areas)
+        self.type_names = dict((t.Id.IntegerValue, t.Name) for t in FilteredElementCollector(doc).OfClass(GroupType))
+        self.group_type = {}            # group id -> group type id
+        self.group_ids_by_type = {}     # group type id -> set of group ids
+        self.areas_by_group = {}        # group id -> member areas
+        self.group_of_area = {}         # area id -> group id
+        for group in FilteredElementCollector(doc).OfClass(Group):
+            group_id = group.Id.IntegerValue
+            type_id = group.GetTypeId().IntegerValue
+            self.group_type[group_id] = type_id
+            self.group_ids_by_type.setdefault(type_id, set()).add(group_id)
+            for member_id in group.GetMemberIds():
+                area = areas_by_id.get(member_id.IntegerValue)
+                if area is not None:
+                    self.areas_by_group.setdefault(group_id, []).append(area)
+                    self.group_of_area[member_id.IntegerValue] = group_id
+
+    def areas_of_type(self, type_id):
+        """Member areas of every instance of a group type."""
+        return [area for group_id in self.group_ids_by_type.get(type_id, ())
+                for area in self.areas_by_group.get(group_id, [])]
+
+
+def build_group_area_index(doc, areas):
+    """Index the given areas by group instance and group type in one pass."""
+    return GroupAreaIndex(doc, areas)
+
+
+def resolve_group_kitchen_areas(selected_groups, group_index, catalogue):
+    """Resolve the apartments and target areas of the groups holding a selected fixture.
+
+    Returns ({apartment number: [group type names]}, [target areas]).
+    """
+    # Filter areas by those that have a specified 'Apartment Number' and are in the selected groups
+    apartment_areas = {}
+    matched_types = set()
+    for group_id in set(selected_groups):
+        type_id = group_index.group_type.get(group_id)
+        for area in group_index.areas_by_group.get(group_id, []):
+            apartment = catalogue.get(area.Id)
+            if apartment and len(apartment.number) <= 8:
+                matched_types.add(type_id)
+                group_names = apartment_areas.setdefault(apartment.number, [])
+                group_name = group_index.type_names.get(type_id, "")
+                if group_name not in group_names:
+                    group_names.append(group_name)
+
+    # Every instance of a matched group type is a target, each area is listed once
+    target_areas = [area for type_id in matched_types for area in group_index.areas_of_type(type_id)]
+    return apartment_areas, target_areas
+
+
+def build_area_index(doc, catalogue=None, level_ids=None, missing=None):
+    """Pack the polygon of every catalogued apartment once per level.
+
+    Returns {level id (int): PackedPolygons} keyed by (area id, apartment number).
+    Pass level_ids to index only those levels, and a list as missing to collect
+    the ids (int) of the areas left out because they have no boundary.
+    """
+    if catalogue is None:
+        catalogue = ApartmentCatalogue.from_document(doc)
+    boundary_cache = get_boundary_cache(doc)
+    area_index = {}
+    for level_id, apartments in catalogue.by_level.items():
+        if level_ids is not None and level_id not in level_ids:
+            continue
+        keys = []
+        polygons = []
+        for apartment in apartments:
+            vertices = boundary_cache.get(apartment.area).outer_points
+            if not vertices:
+                if missing is not None:
+                    missing.append(apartment.area_id)
+                continue
+            keys.append((apartment.area.Id, apartment.number))
+            polygons.append(vertices)
+        if polygons:
+            area_index[level_id] = PackedPolygons(polygons, keys)
+    return area_index
+
+
+def locate_fixture_areas(fixtures, area_index, tolerance=1e-6, extra_points_by_level=None):
+    """Return {apartment number: [area ids]} of the indexed areas holding the fixtures.
+
+    extra_points_by_level adds host-coordinate points, e.g. linked fixtures, as
+    {level id (int): [(x, y), ...]}.
+    """
+    # Group fixture points by level so each level is tested in one batch
+    points_by_level = {}
+    for fixture in fixtures:
+        # Line-based fixtures (LocationCurve) have no point and are skipped
+        fixture_location = getattr(fixture.Location, "Point", None) if fixture.Location else None
+        if fixture_location and fixture.LevelId.IntegerValue in area_index:
+            points_by_level.setdefault(fixture.LevelId.IntegerValue, []).append((fixture_location.X, fixture_location.Y))
+    for level_id, points in (extra_points_by_level or {}).items():
+        if level_id in area_index:
+            points_by_level.setdefault(level_id, []).extend(points)
+
+    apartment_areas = {}
+    for level_id, points in points_by_level.items():
+        for matches in area_index[level_id].locate(points, tolerance):
+            for area_id, apartment_number in matches:
+                area_ids = apartment_areas.setdefault(apartment_number, [])
+                if area_id not in area_ids:
+                    area_ids.append(area_id)
+    return dict(sorted(apartment_areas.items(), key=lambda x: x[0]))
+
+
+def _document_version_key(link_doc):
+    """Identity of a link document's loaded version, for the fixture table cache."""
+    try:
+        version = Document.GetDocumentVersion(link_doc)
+        return (link_doc.PathName, str(version.VersionGUID), version.NumberOfSaves)
+    except AttributeError:  # Revit < 2021: no document versions, cache per loaded document
+        return (link_doc.PathName, link_doc.GetHashCode())
+
+
+_LINK_FIXTURE_TABLES = {}
+
+
+def get_link_fixture_table(link_doc):
+    """Return {fixture name: [(x, y, z), ...]} of a link document, in link coordinates.
+
+    Cached per link document version, so reloading an unchanged link or
+    re-running the button reuses the table.
+    """
+    key = _document_version_key(link_doc)
+    table = _LINK_FIXTURE_TABLES.get(key)
+    if table is None:
+        table = {}
+        collector = FilteredElementCollector(link_doc).OfCategory(BuiltInCategory.OST_PlumbingFixtures).WhereElementIsNotElementType()
+        for f in collector:
+            location = f.Location
+            point = getattr(location, "Point", None) if location else None
+            if point is not None:
+                table.setdefault(f.Name, []).append((point.X, point.Y, point.Z))
+        _LINK_FIXTURE_TABLES[key] = table
+    return table
+
+
+def transform_points(transform, points):
+    """Apply a Revit Transform to (x, y, z) tuples without creating an XYZ per point."""
+    o, bx, by, bz = transform.Origin, transform.BasisX, transform.BasisY, transform.BasisZ
+    ox, oy, oz = o.X, o.Y, o.Z
+    xx, xy, xz = bx.X, bx.Y, bx.Z
+    yx, yy, yz = by.X, by.Y, by.Z
+    zx, zy, zz = bz.X, bz.Y, bz.Z
+    return [(ox + x * xx + y * yx + z * zx, oy + x * xy + y * yy + z * zy, oz + x * xz + y * yz + z * zz)
+            for x, y, z in points]
+
+
+def collect_link_fixture_points(doc, link_instances, selected_names, tolerance=1e-3, unloaded=None):
+    """Linked fixtures of the selected names in host coordinates, bucketed by host level.
+
+    Returns {fixture name: {level id (int): [(x, y), ...]}}. Each point goes to the
+    highest host level at or below it. Pass a list as unloaded to collect the
+    names of the link instances skipped because their model is not loaded.
+    """
+    levels = sorted(FilteredElementCollector(doc).OfClass(Level), key=lambda l: l.ProjectElevation)
+    elevations = [l.ProjectElevation for l in levels]
+    level_ids = [l.Id.IntegerValue for l in levels]
+
+    points_by_name = dict((name, {}) for name in selected_names)
+    for link_instance in link_instances:
+        link_doc = link_instance.GetLinkDocument()
+        if link_doc is None:
+            if unloaded is not None:
+                unloaded.append(link_instance.Name)
+            continue
+        table = get_link_fixture_table(link_doc)
+        transform = link_instance.GetTotalTransform()
+        for name in selected_names:
+            for x, y, z in transform_points(transform, table.get(name, [])):
+                i = bisect_right(elevations, z + tolerance) - 1
+                if i >= 0:
+                    points_by_name[name].setdefault(level_ids[i], []).append((x, y))
+    return points_by_name
+
+
+def resolve_kitchen_types(doc, selected_names, match_mode, catalogue=None, tolerance=1e-6, link_instances=None,
+                          missing=None, unloaded=None, group_counts=None):
+    """Classify every selected kitchen type at once, without writing.
+
+    Returns (kitchen_types, apartments_by_name, conflicts) where kitchen_types is
+    {area id (int): fixture name}. When an area matches several names the last
+    selected one wins, as if the names had been run one after another.
+    In area mode, fixtures of the given RevitLinkInstances are matched too.
+
+    :param missing:         list extended with the ids (int) of areas without a boundary (area mode)
+    :param unloaded:        list extended with the names of links that are not loaded (area mode)
+    :param group_counts:    dict filled with {fixture name: grouped fixtures} (group mode)
+    """
+    fixtures_by_name = collect_fixtures_by_name(doc, selected_names)
+    if catalogue is None:
+        catalogue = ApartmentCatalogue.from_document(doc)
+    if match_mode == MATCH_BY_AREAS:
+        area_index = build_area_index(doc, catalogue, missing=missing)
+        link_points = collect_link_fixture_points(doc, link_instances or [], selected_names, unloaded=unloaded)
+    else:
+        group_area_index = build_group_area_index(doc, catalogue.areas)
+
+    apartments_by_name = {}
+    kitchen_types = {}
+    conflicts = 0
+    for selected_name in selected_names:
+        fixtures = fixtures_by_name[selected_name]
+        if match_mode == MATCH_BY_AREAS:
+            apartment_areas = locate_fixture_areas(fixtures, area_index, tolerance, link_points[selected_name])
+            target_area_ids = [area_id.IntegerValue for area_ids in apartment_areas.values() for area_id in area_ids]
+        else:
+            selected_groups = [f.GroupId.IntegerValue for f in fixtures if f.GroupId.IntegerValue != -1]
+            if group_counts is not None:
+                group_counts[selected_name] = len(selected_groups)
+            apartment_areas, target_areas = resolve_group_kitchen_areas(selected_groups, group_area_index, catalogue)
+            target_area_ids = [area.Id.IntegerValue for area in target_areas]
+
+        for area_id in target_area_ids:
+            if kitchen_types.get(area_id, selected_name) != selected_name:
+                conflicts += 1
+            kitchen_types[area_id] = selected_name
+        apartments_by_name[selected_name] = apartment_areas
+    return kitchen_types, apartments_by_name, conflicts
+
+
+def set_kitchen_types(doc, kitchen_types):
+    """Write {area id (int): value} to 'Kitchen Type'; the caller owns the transaction.
+
+    Returns the number of areas whose value actually changed.
+    """
+    count = 0
+    for area_id, kitchen_type in kitchen_types.items():
+        area = doc.GetElement(ElementId(area_id))
+        target_parameter = area.LookupParameter(KITCHEN_TYPE_PARAMETER) if area else None
+        if target_parameter and target_parameter.StorageType == StorageType.String:
+            if (target_parameter.AsString() or "") != kitchen_type:
+                target_parameter.Set(kitchen_type)
+                count += 1
+    return count
+
+
+def kitchen_settings_schema():
+    """Extensible storage schema holding the last classification, see save_kitchen_settings."""
+    schema = Schema.Lookup(SETTINGS_SCHEMA_GUID)
+    if schema is None:
+        builder = SchemaBuilder(SETTINGS_SCHEMA_GUID)
+        builder.SetReadAccessLevel(AccessLevel.Public)
+        builder.SetWriteAccessLevel(AccessLevel.Public)
+        builder.SetSchemaName("NOAAKitchenTypeSettings")
+        builder.SetDocumentation("Fixture names, match mode and linked models the kitchen updater repeats.")
+        builder.AddArrayField(SETTINGS_FIXTURE_NAMES, clr.GetClrType(String))
+        builder.AddSimpleField(SETTINGS_MATCH_MODE, clr.GetClrType(String))
+        builder.AddArrayField(SETTINGS_LINK_IDS, clr.GetClrType(ElementId))
+        schema = builder.Finish()
+    return schema
+
+
+def _settings_storage(doc):
+    """The DataStorage element holding the kitchen settings, or None."""
+    if Schema.Lookup(SETTINGS_SCHEMA_GUID) is None:
+        return None
+    collector = FilteredElementCollector(doc).OfClass(DataStorage).WherePasses(ExtensibleStorageFilter(SETTINGS_SCHEMA_GUID))
+    for storage in collector:
+        return storage
+    return None
+
+
+def save_kitchen_settings(doc, selected_names, match_mode, link_instances=()):
+    """Remember the last classification in the model, so the kitchen updater repeats it for
+    everyone editing the file; the caller owns the transaction.
+
+    The settings live on a DataStorage element of their own (created on first save), not on
+    Project Information, so a worksharing user holding Project Information does not block them.
+
+    :param link_instances:  RevitLinkInstances whose fixtures were matched (area mode)
+    """
+    entity = Entity(kitchen_settings_schema())
+    entity.Set[IList[String]](SETTINGS_FIXTURE_NAMES, List[String](list(selected_names)))
+    entity.Set[String](SETTINGS_MATCH_MODE, match_mode)
+    entity.Set[IList[ElementId]](SETTINGS_LINK_IDS, List[ElementId]([link.Id for link in link_instances or []]))
+    storage = _settings_storage(doc) or DataStorage.Create(doc)
+    storage.SetEntity(entity)
+
+
+def load_kitchen_settings(doc):
+    """Return (fixture names, match mode, link instances) of the model's last classification,
+    or ([], None, []). Links removed from the model since are left out."""
+    storage = _settings_storage(doc)
+    if storage is None:
+        return [], None, []
+    entity = storage.GetEntity(Schema.Lookup(SETTINGS_SCHEMA_GUID))
+    if entity is None or not entity.IsValid():
+        return [], None, []
+    link_instances = [doc.GetElement(link_id) for link_id in entity.Get[IList[ElementId]](SETTINGS_LINK_IDS) or []]
+    return (list(entity.Get[IList[String]](SETTINGS_FIXTURE_NAMES)), entity.Get[String](SETTINGS_MATCH_MODE) or None,
+            [link for link in link_instances if link is not None])
@@ -0,0 +1,299 @@
+"""Room tag placement shared by CenterRoomTags and TagRoomsSheets.
+
+A room's target point is its pole of inaccessibility: the interior point
+farthest from every boundary loop, found with polylabel over the cached
+boundary polygon. It lies inside the room by construction, so placement needs
+no IsPointInRoom probing, and L-shaped or ring-shaped rooms get a readable
+spot instead of being skipped.
+"""
+
+from Autodesk.Revit.DB import ElementId, XYZ
+
+from noaa.geometry import GridIndex, interior_grid_points, point_to_rings_distance, polylabel
+
+# Search stops once no point can be more than this much farther from the walls (feet, ~3 cm)
+LABEL_PRECISION = 0.1
+# Rooms and tags closer than this (in plan) to their target are not written (feet, ~3 mm)
+MOVE_TOLERANCE = 0.01
+# Free spots tried per overlapping tag before it is left where it is
+DEOVERLAP_CANDIDATES = 40
+
+# Room placement states
+PLACED = "Placed"
+UNPLACED = "Not placed"
+NOT_ENCLOSED = "Not enclosed"
+REDUNDANT = "Redundant"
+NO_BOUNDARY = "No boundary"
+
+
+def room_label_point(room, boundary_cache, precision=LABEL_PRECISION):
+    """Pole of inaccessibility of a room at its location height, or None if it has no boundary."""
+    boundaries = boundary_cache.get(room)
+    if not boundaries:
+        return None
+    x, y, _ = polylabel(boundaries.points, precision)
+    z = room.Location.Point.Z if room.Location else boundaries.outer_points[0][2]
+    return XYZ(x, y, z)
+
+
+def _needs_move(location, new_pt, tolerance):
+    """True when a location point is farther than tolerance from new_pt in plan."""
+    point = location.Point
+    dx = point.X - new_pt.X
+    dy = point.Y - new_pt.Y
+    return dx * dx + dy * dy > tolerance * tolerance
+
+
+def room_state(room, boundary_cache):
+    """Placement state of a room from Location and Area, the boundary only deciding the edge cases.
+
+    Unplaced rooms have no Location; unenclosed and redundant rooms have a zero
+    Area, redundant ones still reporting a boundary (shared with another room).
+    """
+    if room.Location is None:
+        return UNPLACED
+    if room.Area > 0:
+        return PLACED if boundary_cache.get(room) else NO_BOUNDARY
+    return REDUNDANT if boundary_cache.get(room) else NOT_ENCLOSED
+
+
+class RoomStates(object):
+    """Placement state per room id, so problem rooms are dropped before any geometry work."""
+
+    def __init__(self, boundary_cache):
+        self.boundary_cache = boundary_cache
+        self._states = {}
+        self.orphaned_tags = 0
+
+    def state(self, room):
+        room_id = room.Id.IntegerValue
+        state = self._states.get(room_id)
+        if state is None:
+            state = self._states[room_id] = room_state(room, self.boundary_cache)
+        return state
+
+    def usable(self, room):
+        """True for placed rooms with a boundary."""
+        return self.state(room) == PLACED
+
+    def usable_tags(self, tags):
+        """Tags whose room is usable; tags without a room are counted as orphaned."""
+        usable = []
+        for tag in tags:
+            room = tag.Room
+            if room is None:
+                self.orphaned_tags += 1
+            elif self.usable(room):
+                usable.append(tag)
+        return usable
+
+    def excluded(self):
+        """{state: [room ids (int)]} of every room that was left out."""
+        excluded = {}
+        for room_id, state in self._states.items():
+            if state != PLACED:
+                excluded.setdefault(state, []).append(room_id)
+        return excluded
+
+    def summary(self):
+        lines = []
+        for state, room_ids in sorted(self.excluded().items()):
+            lines.append("Rooms excluded ({}): {} - ids: {}".format(state, len(room_ids), ", ".join(str(i) for i in sorted(room_ids))))
+        if self.orphaned_tags:
+            lines.append("Tags without a room: {}".format(self.orphaned_tags))
+        return "\n".join(lines) if lines else "No rooms excluded."
+
+
+def move_room_and_tag(tag, room, new_pt, tolerance=MOVE_TOLERANCE, move_tag=True):
+    """Function to move both Room and Tag Locations, if they are not part of the group.
+    Locations already within tolerance of new_pt are left untouched, so the element is not dirtied.
+    :param tag:         Room Tag
+    :param room:        Room
+    :param new_pt:      XYZ Point.
+    :param tolerance:   plan distance (feet) below which nothing is written
+    :param move_tag:    False to move only the room, e.g. for a tag settled by de-overlapping
+    :return:            True if the room or the tag was moved"""
+    moved = False
+    if room.GroupId == ElementId(-1) and _needs_move(room.Location, new_pt, tolerance): #ElementId(-1) means None
+        room.Location.Point = new_pt
+        moved = True
+
+    if move_tag and tag.GroupId == ElementId(-1) and _needs_move(tag.Location, new_pt, tolerance):
+        tag.Location.Point = new_pt
+        moved = True
+    return moved
+
+
+class MoveReport(object):
+    """Moved / skipped / failed tag counts of a run, plus the de-overlap pass results."""
+
+    def __init__(self):
+        self.moved = 0
+        self.skipped = 0
+        self.failed = 0
+        self.nudged = 0
+        self.overlapping = 0
+
+    def counts(self):
+        return (self.moved, self.skipped, self.failed, self.nudged, self.overlapping)
+
+    def restore(self, counts):
+        """Go back to earlier counts, e.g. after the transaction holding the moves rolled back."""
+        self.moved, self.skipped, self.failed, self.nudged, self.overlapping = counts
+
+    def separate(self, view, tags, boundary_cache):
+        """separate_room_tags, counted."""
+        nudged, overlapping = separate_room_tags(view, tags, boundary_cache)
+        self.nudged += nudged
+        self.overlapping += overlapping
+
+    def move(self, tag, room, new_pt, tolerance=MOVE_TOLERANCE, move_tag=True):
+        """move_room_and_tag, counted; a missing target (no boundary) or an API error counts as failed."""
+        if new_pt is None:
+            self.failed += 1
+            return
+        try:
+            if move_room_and_tag(tag, room, new_pt, tolerance, move_tag):
+                self.moved += 1
+            else:
+                self.skipped += 1
+        except Exception as e:
+            self.failed += 1
+            print("Error moving tag {}: {}".format(tag.Id, e))
+
+    def __str__(self):
+        text = "Tags moved: {}, skipped (already in place): {}, failed: {}".format(self.moved, self.skipped, self.failed)
+        if self.nudged or self.overlapping:
+            text += "\nTags nudged off others: {}, still overlapping: {}".format(self.nudged, self.overlapping)
+        return text
+
+
+class RoomLabelPoints(object):
+    """Label points keyed by room id, computed once per run.
+
+    A room shows up in every plan of its level (floor plan, furniture, finishes
+    ...); with this cache its boundary and label point are worked out for the
+    first of those views and reused by the rest.
+    """
+
+    def __init__(self, boundary_cache, precision=LABEL_PRECISION):
+        self.boundary_cache = boundary_cache
+        self.precision = precision
+        self._points = {}
+
+    def __len__(self):
+        return len(self._points)
+
+    def get(self, room):
+        """Label point of a room (XYZ), or None if it has no boundary."""
+        room_id = room.Id.IntegerValue
+        if room_id not in self._points:
+            self._points[room_id] = room_label_point(room, self.boundary_cache, self.precision)
+        return self._points[room_id]
+
+
+def _tag_extent(tag, view):
+    """(min_x, min_y, max_x, max_y) of a tag in the view, or None."""
+    bb = tag.get_BoundingBox(view)
+    if bb is None:
+        return None
+    return (bb.Min.X, bb.Min.Y, bb.Max.X, bb.Max.Y)
+
+
+def _room_area(tag):
+    room = tag.Room
+    return room.Area if room is not None else 0.0
+
+
+def deoverlapped_tags(view, tags, targets, boundary_cache, tolerance=MOVE_TOLERANCE):
+    """Ids (int) of the tags a previous de-overlap pass left off their target, to keep them there.
+
+    A tag is settled when centring it would make it overlap another tag (at the
+    place centring puts that one), while where it stands it overlaps nothing and
+    lies inside its room: exactly what separate_room_tags leaves behind. Centring
+    such a tag would only have the next de-overlap pass nudge it again. Read
+    before any tag is moved.
+
+    :param targets: {tag id (int): target XYZ or None}, the points the tags are centred on
+    """
+    extents = {}
+    centred = {}
+    for tag in tags:
+        extent = _tag_extent(tag, view)
+        if extent is None:
+            continue
+        key = tag.Id.IntegerValue
+        extents[key] = (tag, extent)
+        target = targets.get(key)
+        if target is None or tag.GroupId != ElementId(-1) or not _needs_move(tag.Location, target, tolerance):
+            centred[key] = extent
+        else:
+            dx = target.X - tag.Location.Point.X
+            dy = target.Y - tag.Location.Point.Y
+            centred[key] = (extent[0] + dx, extent[1] + dy, extent[2] + dx, extent[3] + dy)
+    if not extents:
+        return set()
+
+    current_grid = GridIndex((key, extent) for key, (tag, extent) in extents.items())
+    centred_grid = GridIndex(centred.items())
+    settled = set()
+    for key, (tag, extent) in extents.items():
+        if centred[key] == extent or not centred_grid.query_box(centred[key], exclude=key):
+            continue    # already centred, or free once centred
+        if current_grid.query_box(extent, exclude=key):
+            continue    # overlapping where it is: centre it and let de-overlapping find a spot
+        boundaries = boundary_cache.get(tag.Room) if tag.Room is not None else None
+        location = tag.Location.Point
+        if boundaries and point_to_rings_distance(location.X, location.Y, boundaries.points) >= 0:
+            settled.add(key)
+    return settled
+
+
+def separate_room_tags(view, tags, boundary_cache, max_candidates=DEOVERLAP_CANDIDATES):
+    """Nudge overlapping room tags of a view to free points inside their rooms.
+
+    Tag extents go into a GridIndex (spatial hash, cell = mean tag size), so each
+    tag is only compared with the tags in the cells it covers. Tags of the
+    smallest rooms are settled first, as they have the fewest spots to choose
+    from. A colliding tag tries grid points inside its room, one tag height
+    apart and nearest first, and takes the first free one. Grouped tags stay
+    put but still block others. Rooms are not moved. Runs inside the caller's
+    transaction; extents must be current (regenerate after earlier moves).
+
+    :return: (nudged, unresolved) tag counts
+    """
+    extents = {}
+    for tag in tags:
+        extent = _tag_extent(tag, view)
+        if extent is not None:
+            extents[tag.Id.IntegerValue] = (tag, extent)
+    if not extents:
+        return (0, 0)
+
+    grid = GridIndex((key, extent) for key, (tag, extent) in extents.items())
+    nudged = unresolved = 0
+    for key, (tag, extent) in sorted(extents.items(), key=lambda item: _room_area(item[1][0])):
+        if not grid.query_box(extent, exclude=key):
+            continue
+        if tag.GroupId != ElementId(-1) or tag.Room is None:
+            unresolved += 1
+            continue
+        boundaries = boundary_cache.get(tag.Room)
+        if not boundaries:
+            unresolved += 1
+            continue
+
+        location = tag.Location.Point
+        spacing = extent[3] - extent[1]
+        for x, y in interior_grid_points(boundaries.points, spacing, (location.X, location.Y), max_candidates):
+            dx = x - location.X
+            dy = y - location.Y
+            moved_extent = (extent[0] + dx, extent[1] + dy, extent[2] + dx, extent[3] + dy)
+            if not grid.query_box(moved_extent, exclude=key):
+                tag.Location.Point = XYZ(x, y, location.Z)
+                grid.insert(key, moved_extent)
+                nudged += 1
+                break
+        else:
+            unresolved += 1
+    return (nudged, unresolved)
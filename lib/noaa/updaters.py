@@ -0,0 +1,69 @@
+"""Base class and registration shared by the extension's dynamic model updaters."""
+
+from Autodesk.Revit.DB import ChangePriority, IUpdater, UpdaterId, UpdaterRegistry
+
+
+def get_logger(name):
+    """pyRevit logger, imported late so the module loads without pyRevit's runtime."""
+    from pyrevit.coreutils.logger import get_logger as pyrevit_logger
+    return pyrevit_logger(name)
+
+
+class ModelUpdater(IUpdater):
+    """IUpdater plumbing: the updater id, its description, and an Execute that never raises.
+
+    A subclass sets UPDATER_GUID, NAME, INFORMATION and PRIORITY, implements
+    `run(data)` and lists its `triggers()`. startup.py registers each updater
+    once per Revit session through `register_updater`.
+
+    `run` passes the change batch as plain ElementId lists to a module-level
+    function, which writes inside the transaction that made the changes.
+    Because the function takes plain lists, tests can drive it with a
+    stand-in change feed.
+    """
+    UPDATER_GUID = None
+    NAME = ""
+    INFORMATION = ""
+    PRIORITY = ChangePriority.RoomsSpacesZones
+
+    def __init__(self, addin_id):
+        self.updater_id = UpdaterId(addin_id, self.UPDATER_GUID)
+
+    def run(self, data):
+        """Handle one change batch, inside the transaction that made the changes."""
+        raise NotImplementedError
+
+    def triggers(self):
+        """[(element filter, change type)] the updater is registered for."""
+        raise NotImplementedError
+
+    def Execute(self, data):
+        try:
+            self.run(data)
+        except Exception as e:
+            # An exception escaping Execute makes Revit disable the updater for the session
+            get_logger(self.__class__.__module__).error("{} update failed: {}".format(self.NAME, e))
+
+    def GetUpdaterId(self):
+        return self.updater_id
+
+    def GetUpdaterName(self):
+        return self.NAME
+
+    def GetAdditionalInformation(self):
+        return self.INFORMATION
+
+    def GetChangePriority(self):
+        return self.PRIORITY
+
+
+def register_updater(updater):
+    """Register an updater and its triggers once per Revit session; returns its UpdaterId."""
+    updater_id = updater.GetUpdaterId()
+    if UpdaterRegistry.IsUpdaterRegistered(updater_id):
+        return updater_id
+    # Optional, so documents edited without this extension open without warnings
+    UpdaterRegistry.RegisterUpdater(updater, True)
+    for element_filter, change_type in updater.triggers():
+        UpdaterRegistry.AddTrigger(updater_id, element_filter, change_type)
+    return updater_id
@@ -0,0 +1,7 @@
+"""Runs once when pyRevit loads the extension: registers the model updaters."""
+
+from noaa.ceiling_updater import register_ceiling_updater
+from noaa.kitchen_updater import register_kitchen_updater
+
+register_kitchen_updater(__revit__.Application.ActiveAddInId)
+register_ceiling_updater(__revit__.Application.ActiveAddInId)
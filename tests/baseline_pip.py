@@ -0,0 +1,121 @@
+"""PointInPoly as shipped in 04.1 IdentifyGroupsForKitchens before the kitchen
+matcher moved to noaa.geometry.PackedPolygons. Kept verbatim as the reference
+the fuzz tests and the benchmark compare against.
+"""
+
+
+class PointInPoly:
+    def get_quadrant(self, vertex, p):
+        # Unpack only X and Y, ignore Z
+        x, y, _ = vertex  # Assuming vertex is a tuple (x, y, z)
+        p_x, p_y, _ = p  # Similarly, assuming p is a tuple (x, y, z)
+        
+        if x > p_x:
+            return 0 if y > p_y else 3
+        else:
+            return 1 if y > p_y else 2
+
+    def x_intercept(self, p, q, y):
+        """
+        Determine the X intercept of a polygon edge
+        with a horizontal line at the Y value of the
+        test point, considering a tolerance.
+        """
+        assert p[1] != q[1], "unexpected horizontal segment"
+        x_intercept = q[0] - ((q[1] - y) * ((p[0] - q[0]) / (p[1] - q[1])))
+        
+        return x_intercept
+
+
+    def adjust_delta(self, delta, vertex, next_vertex, p):
+        """
+        Adjust the delta based on the quadrant change.
+        """
+        # Convert 'p' to a tuple if it's not already
+        p_tuple = (p.X, p.Y) if hasattr(p, 'X') else p
+
+        if delta == 3:
+            delta = -1
+        elif delta == -3:
+            delta = 1
+        elif delta in [2, -2]:
+            if self.x_intercept(vertex, next_vertex, p_tuple[1]) > p_tuple[0]:  # Use tuple indexing
+                delta = -delta
+        return delta
+
+    def is_point_near_edge(self, p, q, point, tolerance):
+        """
+        Check if a point is near the line segment [p, q] within a given tolerance.
+        
+        Parameters:
+        - p: Start point of the line segment (tuple of x, y).
+        - q: End point of the line segment (tuple of x, y).
+        - point: The point to check (tuple of x, y).
+        - tolerance: The maximum distance from the edge for the point to be considered near.
+        
+        Returns:
+        - True if the point is near the line segment, False otherwise.
+        """
+        px, py, pz = p
+        qx, qy, qz = q
+        x, y, _ = point
+
+        # Calculate the length squared of the line segment [p, q]
+        line_len_squared = (qx - px) ** 2 + (qy - py) ** 2
+        
+        # Avoid division by zero if p and q are the same point
+        if line_len_squared == 0:
+            #print("LINE_LEN_SQUARED IS 0")
+            distance = ((px - x) ** 2 + (py - y) ** 2) ** 0.5
+            return distance <= tolerance
+
+        # Calculate the projection of the point onto the line defined by [p, q]
+        # and clamp it to the line segment
+        t = max(0, min(1, ((x - px) * (qx - px) + (y - py) * (qy - py)) / line_len_squared))
+        proj_x = px + t * (qx - px)
+        proj_y = py + t * (qy - py)
+
+        # Calculate the distance from the point to the projection on the line segment
+        distance = ((proj_x - x) ** 2 + (proj_y - y) ** 2) ** 0.5
+        #print("LINE_LEN_SQUARED IS NOT 0")
+        # Check if the distance is within tolerance
+        return distance <= tolerance
+
+    def polygon_contains(self, polygon, point, TOLERANCE=1e-6):
+        """
+        Determine whether given 2D point lies within the polygon or on its edge within a specified tolerance.
+        
+        Parameters:
+        - polygon: A list of tuples representing the vertices of the polygon [(x1, y1), (x2, y2), ...].
+        - point: The point to check (x, y).
+        - TOLERANCE: The maximum distance from the edge for the point to be considered near.
+        
+        Returns:
+        - True if the point is near the edge or inside the polygon, False otherwise.
+        """
+        # Initialize variables
+        is_near_edge = False
+        angle = 0
+        n = len(polygon)
+        quad = self.get_quadrant(polygon[0], point)
+
+        for i in range(n):
+            vertex = polygon[i]
+            next_vertex = polygon[(i + 1) % n]
+
+            # Check if point is near the current edge; if so, consider it as being on the boundary
+            if self.is_point_near_edge(vertex, next_vertex, point, TOLERANCE):
+                print("Point is near an edge.")
+                is_near_edge = True
+                # If considering on/near an edge as inside, no need to continue further checks
+                return True
+
+            next_quad = self.get_quadrant(next_vertex, point)
+            delta = next_quad - quad
+            delta = self.adjust_delta(delta, vertex, next_vertex, point)
+            angle += delta
+            quad = next_quad
+
+        # If the point was not near any edge, continue with the usual inside/outside determination
+        # The point is inside if the winding number (angle) is 4 or -4
+        return angle == 4 or angle == -4
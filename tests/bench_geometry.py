@@ -0,0 +1,126 @@
+"""Micro-benchmarks of noaa.geometry; run with `python tests/bench_geometry.py`.
+
+Point in polygon (kitchen matching) and room label points (tag placement).
+
+Not collected by pytest. Timings are printed; every kernel's answers are
+checked against the original PointInPoly on the way.
+"""
+
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+import conftest  # noqa: F401  (puts lib on sys.path)
+
+from baseline_pip import PointInPoly
+from noaa import geometry
+from noaa.geometry import PackedPolygons
+from test_geometry import orthogonal_polygon, star_polygon
+
+TOLERANCE = 1e-6
+
+
+def timed(label, function, *args):
+    start = time.time()
+    result = function(*args)
+    elapsed = time.time() - start
+    print("  {:<34} {:8.3f} s".format(label, elapsed))
+    timed.elapsed = elapsed
+    return result
+
+
+def apartment_floor(rng, areas, fixtures):
+    """Areas scattered on a floor plate about 60 ft per area wide, fixtures over the same plate."""
+    side = 60.0 * areas ** 0.5
+    polygons = [star_polygon(rng, center=(rng.uniform(0, side), rng.uniform(0, side)), radius=(8.0, 25.0))
+                for _ in range(areas)]
+    points = [(rng.uniform(0, side), rng.uniform(0, side), 0.0) for _ in range(fixtures)]
+    return polygons, points
+
+
+def baseline_locate(polygons, points):
+    """The pre-index matcher: every fixture against every area."""
+    pip = PointInPoly()
+    return [[j for j, polygon in enumerate(polygons) if pip.polygon_contains(polygon, point, TOLERANCE)]
+            for point in points]
+
+
+def bench_point_in_polygon(sizes=((50, 500), (200, 2000))):
+    rng = random.Random(1)
+    print("Point in polygon (areas x fixtures):")
+    for areas, fixtures in sizes:
+        polygons, points = apartment_floor(rng, areas, fixtures)
+        print(" {} x {}".format(areas, fixtures))
+        expected = timed("PointInPoly, all pairs", baseline_locate, polygons, points)
+        packed = timed("PackedPolygons build", PackedPolygons, polygons)
+        kernels = [("pure Python", False)] + ([("NumPy", True)] if geometry.np is not None else [])
+        for name, use_numpy in kernels:
+            packed.use_numpy = use_numpy
+            hits = timed("PackedPolygons.locate, " + name, packed.locate, points, TOLERANCE)
+            assert [sorted(h) for h in hits] == expected, name + " kernel disagrees with PointInPoly"
+
+
+def bench_kernels(vertices=(8, 64, 256), points=5000):
+    """One polygon, every point a candidate: the containment kernels alone, without the grid."""
+    rng = random.Random(2)
+    print("Containment kernel ({} points in one polygon's bbox):".format(points))
+    for count in vertices:
+        polygon = star_polygon(rng, vertices=count)
+        min_x, min_y, max_x, max_y = geometry.polygon_bbox(polygon)
+        probes = [(rng.uniform(min_x, max_x), rng.uniform(min_y, max_y), 0.0) for _ in range(points)]
+        print(" {} vertices".format(count))
+        expected = timed("PointInPoly", baseline_locate, [polygon], probes)
+        packed = PackedPolygons([polygon])
+        kernels = [("pure Python", False)] + ([("NumPy", True)] if geometry.np is not None else [])
+        for name, use_numpy in kernels:
+            packed.use_numpy = use_numpy
+            hits = timed("PackedPolygons.locate, " + name, packed.locate, probes, TOLERANCE)
+            assert hits == expected, name + " kernel disagrees with PointInPoly"
+
+
+def synthetic_rooms(rng, count):
+    """Concave rooms: stars, rectilinear outlines (L, U, stepped) and rings around a core."""
+    rooms = []
+    for k in range(count):
+        kind = k % 3
+        if kind == 0:
+            rooms.append([star_polygon(rng, radius=(3.0, 15.0))])
+        elif kind == 1:
+            rooms.append([orthogonal_polygon(rng)])
+        else:
+            size = rng.uniform(10, 30)
+            core = rng.uniform(0.2, 0.6) * size
+            cx, cy = rng.uniform(core, size - core), rng.uniform(core, size - core)
+            rooms.append([[(0, 0), (size, 0), (size, size), (0, size)],
+                          [(cx - core / 2, cy - core / 2), (cx - core / 2, cy + core / 2),
+                           (cx + core / 2, cy + core / 2), (cx + core / 2, cy - core / 2)]])
+    return rooms
+
+
+def bench_polylabel(count=3000, precision=0.1):
+    """Room label points: polylabel against the bbox centre the tag tools used before."""
+    rng = random.Random(4)
+    rooms = synthetic_rooms(rng, count)
+    print("Room label points ({} synthetic concave rooms, precision {} ft):".format(count, precision))
+    labels = timed("polylabel", lambda: [geometry.polylabel(rings, precision) for rings in rooms])
+    outside = 0
+    gained = []
+    for rings, (x, y, distance) in zip(rooms, labels):
+        assert distance > 0, "polylabel point outside its room"
+        min_x, min_y, max_x, max_y = geometry.polygon_bbox(rings[0])
+        centre = geometry.point_to_rings_distance((min_x + max_x) / 2.0, (min_y + max_y) / 2.0, rings)
+        if centre <= 0:
+            outside += 1
+        else:
+            gained.append(distance - centre)
+    print("  {:<34} {:8.3f} ms".format("per room", 1000.0 * timed.elapsed / count))
+    print("  {:<34} {:8d}".format("bbox centre outside its room", outside))
+    print("  {:<34} {:8.2f} ft".format("mean clearance gained otherwise", sum(gained) / len(gained)))
+
+
+if __name__ == "__main__":
+    bench_point_in_polygon()
+    bench_kernels()
+    bench_polylabel()
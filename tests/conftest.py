@@ -0,0 +1,9 @@
+import os
+import sys
+
+# The extension's lib folder is on pyRevit's search path; mirror that here
+HERE = os.path.dirname(os.path.abspath(__file__))
+for path in (os.path.join(HERE, os.pardir, "lib"), HERE):
+    path = os.path.normpath(path)
+    if path not in sys.path:
+        sys.path.insert(0, path)
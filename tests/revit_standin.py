@@ -0,0 +1,818 @@
+"""Just enough of the Revit API, in plain Python, to drive the lib/noaa updaters.
+
+`install()` registers stand-in `Autodesk.Revit.DB`, `System`, `clr` and
+`pyrevit` modules, so noaa modules import outside Revit. A `Document` holds
+elements in a dict; areas and rooms are axis-free polygons whose boundary is a
+list of `Line`s. Only the calls the noaa modules make are implemented.
+"""
+
+import logging
+import sys
+import types
+
+
+def rectangle(min_x, min_y, max_x, max_y):
+    """Counter-clockwise (x, y) vertices of an axis-aligned rectangle, for room and area loops."""
+    return [(min_x, min_y), (max_x, min_y), (max_x, max_y), (min_x, max_y)]
+
+
+class _Enum(type):
+    """Any attribute of an enum class is its own name, e.g. StorageType.String == "String"."""
+
+    def __getattr__(cls, name):
+        if name.startswith("__"):
+            raise AttributeError(name)
+        return name
+
+
+class ElementId(object):
+    def __init__(self, value):
+        value = getattr(value, "IntegerValue", value)
+        # Built-in parameter ids stay symbolic (BuiltInParameter members are their names here)
+        self.IntegerValue = value if isinstance(value, str) else int(value)
+
+    def __eq__(self, other):
+        return isinstance(other, ElementId) and other.IntegerValue == self.IntegerValue
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __hash__(self):
+        return hash(self.IntegerValue)
+
+    def __repr__(self):
+        return "ElementId({})".format(self.IntegerValue)
+
+    def __str__(self):
+        return str(self.IntegerValue)
+
+
+ElementId.InvalidElementId = ElementId(-1)
+
+
+class BuiltInCategory(object):
+    OST_PlumbingFixtures = -2001160
+    OST_Areas = -2003200
+    OST_Rooms = -2000160
+    OST_Ceilings = -2000038
+    OST_RoomTags = -2000480
+    OST_IOSModelGroups = -2000095
+
+
+class BuiltInParameter(metaclass=_Enum):
+    pass
+
+
+class StorageType(metaclass=_Enum):
+    pass
+
+
+class ChangePriority(metaclass=_Enum):
+    pass
+
+
+class AccessLevel(metaclass=_Enum):
+    pass
+
+
+class SpatialElementBoundaryLocation(metaclass=_Enum):
+    pass
+
+
+class SpatialElementBoundaryOptions(object):
+    SpatialElementBoundaryLocation = None
+
+
+class XYZ(object):
+    def __init__(self, x=0.0, y=0.0, z=0.0):
+        self.X, self.Y, self.Z = float(x), float(y), float(z)
+
+    def DistanceTo(self, other):
+        return ((self.X - other.X) ** 2 + (self.Y - other.Y) ** 2 + (self.Z - other.Z) ** 2) ** 0.5
+
+    def IsAlmostEqualTo(self, other):
+        return self.DistanceTo(other) < 1e-9
+
+    def __repr__(self):
+        return "XYZ({}, {}, {})".format(self.X, self.Y, self.Z)
+
+
+class Line(object):
+    def __init__(self, start, end):
+        self._ends = (start, end)
+
+    @classmethod
+    def CreateBound(cls, start, end):
+        return cls(start, end)
+
+    def GetEndPoint(self, index):
+        return self._ends[index]
+
+    def CreateReversed(self):
+        return Line(self._ends[1], self._ends[0])
+
+
+class Arc(object):
+    """Only here for isinstance checks; the stand-in boundaries are straight."""
+
+
+class CurveLoop(object):
+    def __init__(self, curves=None):
+        self.curves = list(curves or [])
+
+    def Append(self, curve):
+        self.curves.append(curve)
+
+    def __iter__(self):
+        return iter(self.curves)
+
+    @classmethod
+    def CreateViaCopy(cls, loop):
+        return cls(loop.curves)
+
+    def Flip(self):
+        self.curves = [Line(c.GetEndPoint(1), c.GetEndPoint(0)) for c in reversed(self.curves)]
+
+
+class BoundarySegment(object):
+    def __init__(self, curve):
+        self._curve = curve
+
+    def GetCurve(self):
+        return self._curve
+
+
+class BoundingBoxXYZ(object):
+    def __init__(self, min_point, max_point):
+        self.Min = min_point
+        self.Max = max_point
+
+
+class Category(object):
+    def __init__(self, category_id):
+        self.Id = ElementId(category_id)
+
+
+class Definition(object):
+    def __init__(self, name):
+        self.Name = name
+
+
+class Parameter(object):
+    def __init__(self, name, value, storage_type="String", read_only=False):
+        self.Definition = Definition(name)
+        self.value = value
+        self.StorageType = storage_type
+        self.IsReadOnly = read_only
+
+    @property
+    def HasValue(self):
+        return self.value is not None
+
+    def AsString(self):
+        return self.value if self.StorageType == "String" else None
+
+    def AsDouble(self):
+        return float(self.value or 0.0)
+
+    def AsInteger(self):
+        return int(self.value or 0)
+
+    def AsElementId(self):
+        return self.value if self.value is not None else ElementId(-1)
+
+    def Set(self, value):
+        expected = {"String": str, "Double": float, "Integer": int, "ElementId": ElementId}.get(self.StorageType)
+        if expected is not None and not isinstance(value, expected) and not (expected is float and isinstance(value, int)):
+            raise Exception("Wrong value type for {}: {!r}".format(self.Definition.Name, value))
+        self.value = value
+        return True
+
+    def SetValueString(self, text):
+        """Project units are feet here; False for text that is not a number."""
+        try:
+            self.value = float(text) if self.StorageType == "Double" else int(text)
+        except ValueError:
+            return False
+        return True
+
+
+class LocationPoint(object):
+    def __init__(self, point):
+        self.Point = point
+
+
+class LocationCurve(object):
+    def __init__(self, curve):
+        self.Curve = curve
+
+
+class Element(object):
+    category = None
+
+    def __init__(self, name="", level_id=-1, parameters=None, location=None):
+        self.Id = None
+        self.Document = None
+        self.Name = name
+        self.LevelId = ElementId(level_id)
+        self.GroupId = ElementId(-1)
+        self.Location = LocationPoint(location) if location is not None else None
+        self.Category = Category(self.category) if self.category is not None else None
+        self.parameters = {}
+        for key, value in (parameters or {}).items():
+            self.parameters[key] = value if isinstance(value, Parameter) else Parameter(key, value)
+        self._entities = {}
+
+    @property
+    def Parameters(self):
+        return list(self.parameters.values())
+
+    def LookupParameter(self, name):
+        return self.parameters.get(name)
+
+    def get_Parameter(self, key):
+        """By built-in parameter (its name here) or by Definition, as Revit allows."""
+        if isinstance(key, Definition):
+            return next((p for p in self.parameters.values() if p.Definition.Name == key.Name), None)
+        return self.parameters.get(key)
+
+    def GetTypeId(self):
+        return ElementId(-1)
+
+    def get_BoundingBox(self, view):
+        return None
+
+    def SetEntity(self, entity):
+        self._entities[entity.Schema.GUID] = entity
+
+    def GetEntity(self, schema):
+        return self._entities.get(schema.GUID, Entity())
+
+    # Change types handed to UpdaterRegistry.AddTrigger
+    @staticmethod
+    def GetChangeTypeAny():
+        return "Any"
+
+    @staticmethod
+    def GetChangeTypeGeometry():
+        return "Geometry"
+
+    @staticmethod
+    def GetChangeTypeElementAddition():
+        return "Addition"
+
+    @staticmethod
+    def GetChangeTypeElementDeletion():
+        return "Deletion"
+
+    @staticmethod
+    def GetChangeTypeParameter(parameter_id):
+        return ("Parameter", parameter_id)
+
+
+class ProjectInfo(Element):
+    pass
+
+
+class Level(Element):
+    def __init__(self, name, elevation=0.0):
+        Element.__init__(self, name)
+        self.ProjectElevation = elevation
+        self.Elevation = elevation
+
+
+class FamilyInstance(Element):
+    category = BuiltInCategory.OST_PlumbingFixtures
+
+    def __init__(self, name, level_id, x, y, z=0.0):
+        Element.__init__(self, name, level_id, location=XYZ(x, y, z))
+
+    def move_to(self, x, y, level_id=None):
+        self.Location.Point = XYZ(x, y, self.Location.Point.Z)
+        if level_id is not None:
+            self.LevelId = ElementId(level_id)
+
+
+class SpatialElement(Element):
+    """Area or room: one or more polygons of (x, y) vertices, the first one outer."""
+
+    def __init__(self, number, level_id, loops, parameters=None):
+        parameters = dict(parameters or {})
+        parameters.setdefault("Number", number)
+        Element.__init__(self, number, level_id, parameters)
+        self.loops = [list(loop) for loop in loops]
+        if self.loops:
+            xs = [v[0] for v in self.loops[0]]
+            ys = [v[1] for v in self.loops[0]]
+            self.Location = LocationPoint(XYZ(sum(xs) / len(xs), sum(ys) / len(ys)))
+
+    @property
+    def Area(self):
+        if not self.loops:
+            return 0.0
+        areas = [abs(sum(a[0] * b[1] - b[0] * a[1] for a, b in zip(loop, loop[1:] + loop[:1])) / 2.0)
+                 for loop in self.loops]
+        return areas[0] - sum(areas[1:])
+
+    @property
+    def Perimeter(self):
+        return sum(((b[0] - a[0]) ** 2 + (b[1] - a[1]) ** 2) ** 0.5
+                   for loop in self.loops for a, b in zip(loop, loop[1:] + loop[:1]))
+
+    def get_BoundingBox(self, view):
+        if not self.loops:
+            return None
+        xs = [v[0] for v in self.loops[0]]
+        ys = [v[1] for v in self.loops[0]]
+        return BoundingBoxXYZ(XYZ(min(xs), min(ys)), XYZ(max(xs), max(ys), 10.0))
+
+    def GetBoundarySegments(self, options):
+        return [[BoundarySegment(Line(XYZ(*a), XYZ(*b))) for a, b in zip(loop, loop[1:] + loop[:1])]
+                for loop in self.loops]
+
+
+class Area(SpatialElement):
+    category = BuiltInCategory.OST_Areas
+
+
+class Room(SpatialElement):
+    category = BuiltInCategory.OST_Rooms
+
+
+class RoomTag(Element):
+    """A tag of width x height feet centred on its location; extents follow moves without a regenerate."""
+    category = BuiltInCategory.OST_RoomTags
+
+    def __init__(self, room, x, y, width=4.0, height=1.0):
+        Element.__init__(self, "Room Tag", room.LevelId, location=XYZ(x, y))
+        self.Room = room
+        self.size = (width, height)
+
+    def get_BoundingBox(self, view):
+        point = self.Location.Point
+        half_width, half_height = self.size[0] / 2.0, self.size[1] / 2.0
+        return BoundingBoxXYZ(XYZ(point.X - half_width, point.Y - half_height),
+                              XYZ(point.X + half_width, point.Y + half_height))
+
+
+class GroupType(Element):
+    def __init__(self, name):
+        Element.__init__(self, name)
+        self.groups = []
+
+    @property
+    def Groups(self):
+        return list(self.groups)
+
+
+class Group(Element):
+    category = BuiltInCategory.OST_IOSModelGroups
+
+    def __init__(self, group_type, members):
+        Element.__init__(self, group_type.Name)
+        self.group_type = group_type
+        self.members = list(members)
+        group_type.groups.append(self)
+
+    def GetTypeId(self):
+        return self.group_type.Id
+
+    def GetMemberIds(self):
+        return [member.Id for member in self.members]
+
+
+class Transform(object):
+    def __init__(self, origin=(0.0, 0.0, 0.0)):
+        self.Origin = XYZ(*origin)
+        self.BasisX = XYZ(1, 0, 0)
+        self.BasisY = XYZ(0, 1, 0)
+        self.BasisZ = XYZ(0, 0, 1)
+
+
+class Sketch(Element):
+    def __init__(self, curve_loops):
+        Element.__init__(self, "Sketch")
+        self.Profile = [list(loop) for loop in curve_loops]
+
+
+class Ceiling(Element):
+    category = BuiltInCategory.OST_Ceilings
+
+    def __init__(self, type_id, level_id):
+        Element.__init__(self, "Ceiling", level_id, {
+            "CEILING_HEIGHTABOVELEVEL_PARAM": Parameter("Height Offset From Level", 0.0, "Double"),
+            "ELEM_PARTITION_PARAM": Parameter("Workset", 0, "Integer"),
+            "PHASE_CREATED": Parameter("Phase Created", None, "ElementId"),
+            "HOST_AREA_COMPUTED": Parameter("Area", 0.0, "Double", read_only=True),
+            "Zone": Parameter("Zone", None),
+            "Acoustic Rating": Parameter("Acoustic Rating", None, "Double"),
+            "Fire Rated": Parameter("Fire Rated", None, "Integer"),
+        })
+        self.type_id = type_id
+        self.SketchId = None
+
+    @classmethod
+    def Create(cls, doc, curve_loops, type_id, level_id):
+        if doc.reject_type_ids is not None and type_id in doc.reject_type_ids:
+            doc.failing_ids.append(None)    # placeholder until the ceiling has an id
+        ceiling = doc.add(cls(type_id, level_id))
+        if doc.failing_ids and doc.failing_ids[-1] is None:
+            doc.failing_ids[-1] = ceiling.Id
+        ceiling.SketchId = doc.add(Sketch(curve_loops)).Id
+        return ceiling
+
+    def GetTypeId(self):
+        return self.type_id
+
+    def footprint(self):
+        """(min x, min y, max x, max y) of the sketch, for assertions."""
+        sketch = self.Document.GetElement(self.SketchId)
+        points = [curve.GetEndPoint(0) for curve in sketch.Profile[0]]
+        return (min(p.X for p in points), min(p.Y for p in points), max(p.X for p in points), max(p.Y for p in points))
+
+
+class FailureSeverity(metaclass=_Enum):
+    pass
+
+
+class FailureProcessingResult(metaclass=_Enum):
+    pass
+
+
+class TransactionStatus(metaclass=_Enum):
+    pass
+
+
+class IFailuresPreprocessor(object):
+    pass
+
+
+class FailureMessage(object):
+    def __init__(self, element_ids, severity="Error", text="Ceiling is not valid"):
+        self.element_ids = list(element_ids)
+        self.severity = severity
+        self.text = text
+
+    def GetSeverity(self):
+        return self.severity
+
+    def GetFailingElementIds(self):
+        return list(self.element_ids)
+
+    def GetDescriptionText(self):
+        return self.text
+
+
+class FailuresAccessor(object):
+    def __init__(self, doc, messages):
+        self.doc = doc
+        self.messages = messages
+
+    def GetFailureMessages(self):
+        return list(self.messages)
+
+    def DeleteWarning(self, message):
+        self.messages.remove(message)
+
+    def DeleteElements(self, element_ids):
+        for element_id in element_ids:
+            self.doc.Delete(element_id)
+
+
+class FailureHandlingOptions(object):
+    def __init__(self):
+        self.preprocessor = None
+
+    def SetFailuresPreprocessor(self, preprocessor):
+        self.preprocessor = preprocessor
+
+
+class Transaction(object):
+    """Commit hands the ceilings created from doc.reject_type_ids to the failures preprocessor as errors."""
+
+    def __init__(self, doc, name=""):
+        self.doc = doc
+        self.name = name
+        self.options = FailureHandlingOptions()
+        self.snapshot = None
+        self.ended = False
+
+    def GetFailureHandlingOptions(self):
+        return self.options
+
+    def SetFailureHandlingOptions(self, options):
+        self.options = options
+
+    def Start(self):
+        self.snapshot = dict(self.doc.elements)
+        self.doc.failing_ids = []
+        self.doc.log.append(("start", self.name))
+
+    def HasStarted(self):
+        return self.snapshot is not None
+
+    def HasEnded(self):
+        return self.ended
+
+    def Commit(self):
+        self.ended = True
+        failing = [i for i in self.doc.failing_ids if i is not None and self.doc.GetElement(i) is not None]
+        messages = [FailureMessage([i]) for i in failing]
+        if messages:
+            if self.options.preprocessor is None:
+                return self.RollBack()
+            result = self.options.preprocessor.PreprocessFailures(FailuresAccessor(self.doc, messages))
+            if result == FailureProcessingResult.ProceedWithRollBack:
+                return self.RollBack()
+        self.doc.log.append(("commit", self.name))
+        return TransactionStatus.Committed
+
+    def RollBack(self):
+        self.ended = True
+        self.doc.elements = self.snapshot
+        self.doc.log.append(("rollback", self.name))
+        return TransactionStatus.RolledBack
+
+    def Dispose(self):
+        if self.HasStarted() and not self.ended:
+            self.RollBack()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.Dispose()
+
+
+class TransactionGroup(Transaction):
+    def Start(self):
+        self.snapshot = dict(self.doc.elements)
+
+    def Assimilate(self):
+        self.ended = True
+
+
+class RevitLinkInstance(Element):
+    """A linked model placed at an offset; link_doc None means not loaded."""
+
+    def __init__(self, name, link_doc, offset=(0.0, 0.0, 0.0)):
+        Element.__init__(self, name)
+        self.link_doc = link_doc
+        self.offset = offset
+
+    def GetLinkDocument(self):
+        return self.link_doc
+
+    def GetTotalTransform(self):
+        return Transform(self.offset)
+
+
+class Document(object):
+    _count = 0
+
+    def __init__(self):
+        Document._count += 1
+        self._hash = Document._count    # unlike id(), never reused by a later document
+        self.PathName = "model-{}.rvt".format(self._hash)
+        self.elements = {}
+        self.reject_type_ids = None     # ceiling type ids whose new ceilings fail at commit
+        self.failing_ids = []
+        self.log = []                   # ("start" / "commit" / "rollback", transaction name)
+        self._next_id = 1000
+        self.ProjectInformation = self.add(ProjectInfo("Project Information"))
+
+    def add(self, element):
+        self._next_id += 1
+        element.Id = ElementId(self._next_id)
+        element.Document = self
+        self.elements[self._next_id] = element
+        if isinstance(element, Group):
+            for member in element.members:
+                member.GroupId = element.Id
+        return element
+
+    def GetElement(self, element_id):
+        return self.elements.get(getattr(element_id, "IntegerValue", element_id))
+
+    def Delete(self, element_id):
+        if self.elements.pop(element_id.IntegerValue, None) is None:
+            raise Exception("Element {} does not exist".format(element_id))
+
+    def GetHashCode(self):
+        return self._hash
+
+
+class ElementCategoryFilter(object):
+    def __init__(self, category):
+        self.category = int(category)
+
+    def passes(self, element):
+        return element.Category is not None and element.Category.Id.IntegerValue == self.category
+
+
+class ElementLevelFilter(object):
+    def __init__(self, level_id):
+        self.level_id = level_id
+
+    def passes(self, element):
+        return element.LevelId == self.level_id
+
+
+class DataStorage(Element):
+    @classmethod
+    def Create(cls, doc):
+        return doc.add(cls("Data Storage"))
+
+
+class ExtensibleStorageFilter(object):
+    def __init__(self, guid):
+        self.guid = guid
+
+    def passes(self, element):
+        return self.guid in element._entities
+
+
+class FilteredElementCollector(object):
+    def __init__(self, doc):
+        self.elements = list(doc.elements.values())
+
+    def _where(self, predicate):
+        self.elements = [e for e in self.elements if predicate(e)]
+        return self
+
+    def OfCategory(self, category):
+        return self._where(ElementCategoryFilter(category).passes)
+
+    def OfClass(self, cls):
+        return self._where(lambda e: isinstance(e, cls))
+
+    def WhereElementIsNotElementType(self):
+        return self._where(lambda e: not isinstance(e, GroupType))
+
+    def WherePasses(self, element_filter):
+        return self._where(element_filter.passes)
+
+    def __iter__(self):
+        return iter(list(self.elements))
+
+
+class _Generic(object):
+    """entity.Set[T](...) / entity.Get[T](...): the type argument is ignored."""
+
+    def __init__(self, function):
+        self.function = function
+
+    def __getitem__(self, clr_type):
+        return self.function
+
+
+class Schema(object):
+    _registry = {}
+
+    def __init__(self, guid, fields):
+        self.GUID = guid
+        self.fields = fields
+
+    @classmethod
+    def Lookup(cls, guid):
+        return cls._registry.get(guid)
+
+
+class SchemaBuilder(object):
+    def __init__(self, guid):
+        self.guid = guid
+        self.fields = []
+
+    def SetReadAccessLevel(self, level):
+        pass
+
+    def SetWriteAccessLevel(self, level):
+        pass
+
+    def SetSchemaName(self, name):
+        pass
+
+    def SetDocumentation(self, text):
+        pass
+
+    def AddSimpleField(self, name, clr_type):
+        self.fields.append(name)
+
+    def AddArrayField(self, name, clr_type):
+        self.fields.append(name)
+
+    def Finish(self):
+        schema = Schema._registry[self.guid] = Schema(self.guid, self.fields)
+        return schema
+
+
+class Entity(object):
+    def __init__(self, schema=None):
+        self.Schema = schema
+        self.values = {}
+        self.Set = _Generic(self._set)
+        self.Get = _Generic(self.values.get)
+
+    def _set(self, name, value):
+        if name not in self.Schema.fields:
+            raise Exception("No field {} in schema".format(name))
+        self.values[name] = value
+
+    def IsValid(self):
+        return self.Schema is not None
+
+
+class IUpdater(object):
+    pass
+
+
+class UpdaterId(object):
+    def __init__(self, addin_id, guid):
+        self.key = (addin_id, guid)
+
+    def __eq__(self, other):
+        return isinstance(other, UpdaterId) and other.key == self.key
+
+    def __hash__(self):
+        return hash(self.key)
+
+
+class UpdaterRegistry(object):
+    updaters = {}
+    triggers = []
+
+    @classmethod
+    def IsUpdaterRegistered(cls, updater_id):
+        return updater_id in cls.updaters
+
+    @classmethod
+    def RegisterUpdater(cls, updater, optional):
+        cls.updaters[updater.GetUpdaterId()] = updater
+
+    @classmethod
+    def AddTrigger(cls, updater_id, element_filter, change_type):
+        cls.triggers.append((updater_id, element_filter, change_type))
+
+    @classmethod
+    def reset(cls):
+        cls.updaters.clear()
+        del cls.triggers[:]
+
+
+class UpdaterData(object):
+    """What Revit hands to IUpdater.Execute for one change batch."""
+
+    def __init__(self, doc, added=(), modified=(), deleted=()):
+        self.doc = doc
+        self.added = [e.Id if isinstance(e, Element) else e for e in added]
+        self.modified = [e.Id if isinstance(e, Element) else e for e in modified]
+        self.deleted = [e.Id if isinstance(e, Element) else e for e in deleted]
+
+    def GetDocument(self):
+        return self.doc
+
+    def GetAddedElementIds(self):
+        return list(self.added)
+
+    def GetModifiedElementIds(self):
+        return list(self.modified)
+
+    def GetDeletedElementIds(self):
+        return list(self.deleted)
+
+
+class _GenericType(object):
+    """IList[String] / List[String]: the type argument is ignored, a Python list stands in."""
+
+    def __getitem__(self, clr_type):
+        return list
+
+
+def _module(name, **attributes):
+    module = types.ModuleType(name)
+    module.__dict__.update(attributes)
+    sys.modules[name] = module
+    return module
+
+
+def install():
+    """Register the stand-in modules; idempotent."""
+    if getattr(sys.modules.get("Autodesk.Revit.DB"), "STANDIN", False):
+        return
+    db_names = dict((name, value) for name, value in globals().items()
+                    if isinstance(value, type) and not name.startswith("_"))
+    db = _module("Autodesk.Revit.DB", STANDIN=True, **db_names)
+    db.ExtensibleStorage = _module("Autodesk.Revit.DB.ExtensibleStorage", AccessLevel=AccessLevel, DataStorage=DataStorage,
+                                   Entity=Entity, ExtensibleStorageFilter=ExtensibleStorageFilter, Schema=Schema,
+                                   SchemaBuilder=SchemaBuilder)
+    revit = _module("Autodesk.Revit", DB=db)
+    _module("Autodesk", Revit=revit)
+
+    generic = _module("System.Collections.Generic", IList=_GenericType(), List=_GenericType())
+    collections = _module("System.Collections", Generic=generic)
+    _module("System", Guid=str, String=str, Collections=collections)
+    _module("clr", GetClrType=lambda t: t)
+
+    logger = _module("pyrevit.coreutils.logger", get_logger=logging.getLogger)
+    coreutils = _module("pyrevit.coreutils", logger=logger)
+    _module("pyrevit", coreutils=coreutils)
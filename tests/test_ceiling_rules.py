@@ -0,0 +1,108 @@
+"""Rules table matching order (noaa.ceiling_rules) and how its values reach a ceiling."""
+
+import json
+
+import pytest
+
+import revit_standin
+from revit_standin import Ceiling, Document, Element, Level, Parameter, Room, rectangle
+
+revit_standin.install()
+
+from noaa.boundaries import get_boundary_cache  # noqa: E402
+from noaa.ceiling_rules import CeilingRules  # noqa: E402
+from noaa.ceilings import CREATED, NO_RULE, apply_rules, create_ceilings, plan_ceilings, set_ceiling_values  # noqa: E402
+
+
+def rules(*rows):
+    return CeilingRules([dict(zip(("field", "pattern", "ceiling_type"), row)) for row in rows])
+
+
+def matched_type(table, **values):
+    rule = table.match(values)
+    return rule.ceiling_type if rule else None
+
+
+def test_first_row_wins_across_exact_wildcard_and_regex():
+    table = rules(("Name", "Bath*", "Tiles"), ("Name", "Bathroom", "Plain"), ("Name", "re:bath.*", "Regex"))
+    assert matched_type(table, Name="Bathroom") == "Tiles"
+    table = rules(("Name", "re:bath.*", "Regex"), ("Name", "Bath*", "Tiles"), ("Name", "Bathroom", "Plain"))
+    assert matched_type(table, Name="Bathroom") == "Regex"
+    table = rules(("Name", "Bathroom", "Plain"), ("Name", "re:bath.*", "Regex"), ("Name", "Bath*", "Tiles"))
+    assert matched_type(table, Name="Bathroom") == "Plain"
+
+
+def test_later_patterns_still_match_when_earlier_ones_do_not():
+    table = rules(("Name", "Kitchen", "Plain"), ("Name", "Bed?oom", "Acoustic"), ("Name", "re:^(wc|toilet)$", "Tiles"))
+    assert matched_type(table, Name="bedroom") == "Acoustic"
+    assert matched_type(table, Name="WC") == "Tiles"
+    assert matched_type(table, Name="Toilets") is None
+
+
+def test_first_row_wins_across_fields():
+    table = rules(("Department", "Wet", "Tiles"), ("Name", "Bathroom", "Plain"))
+    assert matched_type(table, Name="Bathroom", Department="Wet") == "Tiles"
+    assert matched_type(table, Name="Bathroom", Department="Dry") == "Plain"
+    assert matched_type(table, Name="Bathroom", Department=None) == "Plain"
+
+
+def test_duplicate_exact_patterns_keep_the_first_row():
+    table = rules(("Name", "Hall", "First"), ("Name", "HALL", "Second"))
+    assert matched_type(table, Name="hall") == "First"
+
+
+def test_incomplete_row_is_rejected():
+    with pytest.raises(ValueError):
+        rules(("Name", "", "Plain"))
+
+
+def test_load_json_and_csv(tmp_path):
+    rows = [{"field": "Name", "pattern": "Bath*", "ceiling_type": "Tiles", "offset_mm": 2438.4, "Fire Rated": 1}]
+    json_path = tmp_path / "rules.json"
+    json_path.write_text(json.dumps(rows))
+    csv_path = tmp_path / "rules.csv"
+    csv_path.write_text("field,pattern,ceiling_type,offset_mm,Fire Rated\nName,Bath*,Tiles,2438.4,1\n")
+    for path in (json_path, csv_path):
+        rule = CeilingRules.load(str(path)).match({"Name": "Bathroom"})
+        assert rule.ceiling_type == "Tiles" and abs(rule.offset - 8.0) < 1e-9
+        assert str(rule.values["Fire Rated"]) == "1"
+
+
+@pytest.fixture
+def ceiling():
+    doc = Document()
+    level = doc.add(Level("Level 1"))
+    return Ceiling.Create(doc, [], doc.add(Element("Ceiling")).Id, level.Id)
+
+
+def test_values_are_converted_by_storage_type(ceiling):
+    ceiling.parameters["Mark"] = Parameter("Mark", None)
+    values = {"Mark": 12, "Acoustic Rating": "0.7", "Fire Rated": True, "Zone": "Z1"}
+    assert set_ceiling_values(ceiling, 1.0, values) == []
+    assert ceiling.LookupParameter("Mark").AsString() == "12"
+    assert ceiling.LookupParameter("Acoustic Rating").AsDouble() == 0.7
+    assert ceiling.LookupParameter("Fire Rated").AsInteger() == 1
+    assert ceiling.LookupParameter("Zone").AsString() == "Z1"
+
+
+def test_values_that_cannot_be_set_are_reported(ceiling):
+    values = {"Acoustic Rating": "loud", "Fire Rated": "maybe", "Phase Created": "New", "Nonexistent": 1}
+    assert sorted(set_ceiling_values(ceiling, 0.0, values)) == ["Acoustic Rating", "Fire Rated", "Nonexistent",
+                                                                "Phase Created"]
+
+
+def test_apply_rules_reports_unwritten_values():
+    doc = Document()
+    level = doc.add(Level("Level 1"))
+    tiles = doc.add(Element("Tiles"))
+    tiles.parameters["SYMBOL_NAME_PARAM"] = Parameter("Type Name", "Tiles")
+    rooms = [doc.add(Room(number, level.Id, [rectangle(10 * k, 0, 10 * k + 10, 10)], {"Name": name}))
+             for k, (number, name) in enumerate([("R1", "Bathroom"), ("R2", "Store")])]
+    table = CeilingRules([{"field": "Name", "pattern": "Bath*", "ceiling_type": "Tiles", "Acoustic Rating": "loud",
+                           "Fire Rated": 1}])
+    jobs = plan_ceilings(rooms, get_boundary_cache(doc))
+    apply_rules(jobs, table, [tiles])
+    create_ceilings(doc, jobs)
+    assert [job.status for job in jobs] == [CREATED, NO_RULE]
+    assert jobs[0].detail == "not written: Acoustic Rating"
+    assert doc.GetElement(jobs[0].ceiling_id).LookupParameter("Fire Rated").AsInteger() == 1
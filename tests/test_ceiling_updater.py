@@ -0,0 +1,114 @@
+"""Ceilings rebuilt by update_room_ceilings when their room changes, and the updater around it."""
+
+import pytest
+
+import revit_standin
+from revit_standin import Ceiling, Document, Element, Level, Room, UpdaterData, rectangle
+
+revit_standin.install()
+
+from noaa import ceiling_updater, updaters  # noqa: E402
+from noaa.boundaries import get_boundary_cache  # noqa: E402
+from noaa.ceiling_updater import CeilingFollowsRoomUpdater, register_ceiling_updater, update_room_ceilings  # noqa: E402
+from noaa.ceilings import create_ceilings, plan_ceilings, source_room_id  # noqa: E402
+
+
+def ceilings(doc):
+    return [e for e in doc.elements.values() if isinstance(e, Ceiling)]
+
+
+@pytest.fixture
+def model():
+    """Two rooms side by side, each with a ceiling generated from it."""
+    doc = Document()
+    level = doc.add(Level("Level 1"))
+    ceiling_type = doc.add(Element("Ceiling 600x600"))
+    rooms = [doc.add(Room("R{}".format(k), level.Id, [rectangle(10 * k, 0, 10 * k + 10, 10)],
+                          {"Zone": "Z{}".format(k)})) for k in range(2)]
+    create_ceilings(doc, plan_ceilings(rooms, get_boundary_cache(doc), ceiling_type, 0.5))
+    return doc, rooms
+
+
+def ceiling_of(doc, room):
+    found = [c for c in ceilings(doc) if source_room_id(c) == room.Id]
+    assert len(found) == 1
+    return found[0]
+
+
+def test_moved_boundary_rebuilds_the_room_ceiling(model):
+    doc, rooms = model
+    old = ceiling_of(doc, rooms[0])
+    rooms[0].loops = [rectangle(0, 0, 10, 14)]
+    assert update_room_ceilings(doc, [rooms[0].Id]) == 1
+    new = ceiling_of(doc, rooms[0])
+    assert doc.GetElement(old.Id) is None
+    assert new.footprint() == (0, 0, 10, 14)
+    assert new.GetTypeId() == old.GetTypeId() and new.LevelId == old.LevelId
+    assert new.get_Parameter("CEILING_HEIGHTABOVELEVEL_PARAM").AsDouble() == 0.5
+    assert new.LookupParameter("Zone").AsString() == "Z0"
+    # The other room's ceiling is not touched
+    assert ceiling_of(doc, rooms[1]).footprint() == (10, 0, 20, 10)
+
+
+def test_rebuild_keeps_numbers_ids_and_workset(model):
+    doc, rooms = model
+    old = ceiling_of(doc, rooms[0])
+    phase = doc.add(Element("New Construction"))
+    old.LookupParameter("Acoustic Rating").Set(0.7)
+    old.LookupParameter("Fire Rated").Set(1)
+    old.get_Parameter("PHASE_CREATED").Set(phase.Id)
+    old.get_Parameter("ELEM_PARTITION_PARAM").Set(42)
+    rooms[0].loops = [rectangle(0, 0, 10, 14)]
+    update_room_ceilings(doc, [rooms[0].Id])
+    new = ceiling_of(doc, rooms[0])
+    assert new.LookupParameter("Acoustic Rating").AsDouble() == 0.7
+    assert new.LookupParameter("Fire Rated").AsInteger() == 1
+    assert new.get_Parameter("PHASE_CREATED").AsElementId() == phase.Id
+    assert new.get_Parameter("ELEM_PARTITION_PARAM").AsInteger() == 42
+
+
+def test_unchanged_footprint_is_left_alone(model):
+    doc, rooms = model
+    old = ceiling_of(doc, rooms[0])
+    rooms[0].Location.Point = revit_standin.XYZ(2, 2)
+    assert update_room_ceilings(doc, [rooms[0].Id]) == 0
+    assert ceiling_of(doc, rooms[0]) is old
+
+
+def test_unenclosed_room_keeps_its_ceiling(model):
+    doc, rooms = model
+    old = ceiling_of(doc, rooms[0])
+    rooms[0].loops = []
+    assert update_room_ceilings(doc, [rooms[0].Id]) == 0
+    assert doc.GetElement(old.Id) is old
+
+
+def test_updater_execute(model):
+    doc, rooms = model
+    rooms[1].loops = [rectangle(10, 0, 25, 10)]
+    CeilingFollowsRoomUpdater("addin").Execute(UpdaterData(doc, modified=[rooms[1]]))
+    assert ceiling_of(doc, rooms[1]).footprint() == (10, 0, 25, 10)
+
+
+def test_updater_execute_logs_instead_of_raising(model, monkeypatch):
+    doc, rooms = model
+    errors = []
+
+    def fail(doc, changed_room_ids):
+        raise RuntimeError("boom")
+
+    class Logger(object):
+        def error(self, message):
+            errors.append(message)
+
+    monkeypatch.setattr(ceiling_updater, "update_room_ceilings", fail)
+    monkeypatch.setattr(updaters, "get_logger", lambda name: Logger())
+    CeilingFollowsRoomUpdater("addin").Execute(UpdaterData(doc, modified=[rooms[0]]))
+    assert errors == ["NOAA Ceiling Follows Room update failed: boom"]
+
+
+def test_register_once():
+    revit_standin.UpdaterRegistry.reset()
+    first = register_ceiling_updater("addin")
+    assert register_ceiling_updater("addin") == first
+    assert len(revit_standin.UpdaterRegistry.triggers) == 1
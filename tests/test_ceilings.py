@@ -0,0 +1,104 @@
+"""noaa.ceilings: covered rooms, replace mode and ceiling footprints read from sketches."""
+
+import pytest
+
+import revit_standin
+from revit_standin import XYZ, Ceiling, CurveLoop, Document, Element, Level, Line, Room, rectangle
+
+revit_standin.install()
+
+from noaa.boundaries import get_boundary_cache  # noqa: E402
+from noaa.ceilings import (COVERED, CREATED, FAILED, CeilingFootprints, ceiling_rings, create_ceilings,  # noqa: E402
+                           mark_covered, plan_ceilings)
+from noaa.geometry import polygon_area  # noqa: E402
+
+
+def curve_loop(points):
+    return CurveLoop([Line(XYZ(*a), XYZ(*b)) for a, b in zip(points, points[1:] + points[:1])])
+
+
+@pytest.fixture
+def floor():
+    """Three rooms in a row; one corridor-wide ceiling over the first two."""
+    doc = Document()
+    level = doc.add(Level("Level 1"))
+    ceiling_type = doc.add(Element("Ceiling 600x600"))
+    rooms = [doc.add(Room("R{}".format(k), level.Id, [rectangle(10 * k, 0, 10 * k + 10, 10)])) for k in range(3)]
+    shared = Ceiling.Create(doc, [curve_loop(rectangle(0, 0, 20, 10))], ceiling_type.Id, level.Id)
+    return doc, level, ceiling_type, rooms, shared
+
+
+def plan(doc, rooms, ceiling_type, replace=True, level_rooms=None):
+    cache = get_boundary_cache(doc)
+    jobs = plan_ceilings(rooms, cache, ceiling_type)
+    mark_covered(jobs, CeilingFootprints(doc), cache, replace, level_rooms)
+    return jobs
+
+
+def test_without_replace_covered_rooms_are_skipped(floor):
+    doc, _, ceiling_type, rooms, shared = floor
+    jobs = plan(doc, rooms, ceiling_type, replace=False)
+    assert [job.status for job in jobs] == [COVERED, COVERED, None]
+
+
+def test_ceiling_shared_with_an_unselected_room_is_kept(floor):
+    doc, _, ceiling_type, rooms, shared = floor
+    jobs = plan(doc, rooms[:1], ceiling_type, level_rooms=rooms)
+    assert jobs[0].status == COVERED and "outside this run" in jobs[0].detail
+    create_ceilings(doc, jobs)
+    assert doc.GetElement(shared.Id) is not None
+
+
+def test_shared_ceiling_is_replaced_once(floor):
+    doc, _, ceiling_type, rooms, shared = floor
+    jobs = plan(doc, rooms, ceiling_type, level_rooms=rooms)
+    assert [job.replace_ids for job in jobs] == [[shared.Id.IntegerValue], [shared.Id.IntegerValue], []]
+    create_ceilings(doc, jobs)
+    assert [job.status for job in jobs] == [CREATED] * 3
+    assert doc.GetElement(shared.Id) is None
+    assert not [job.detail for job in jobs if job.detail]
+    footprints = sorted(c.footprint() for c in doc.elements.values() if isinstance(c, Ceiling))
+    assert footprints == [(0, 0, 10, 10), (10, 0, 20, 10), (20, 0, 30, 10)]
+
+
+def test_rejected_ceiling_keeps_the_one_it_replaces(floor):
+    doc, _, ceiling_type, rooms, shared = floor
+    bad_type = doc.add(Element("Broken ceiling type"))
+    doc.reject_type_ids = [bad_type.Id]
+    jobs = plan(doc, rooms[:2], ceiling_type, level_rooms=rooms)
+    jobs[1].type_id = bad_type.Id
+    create_ceilings(doc, jobs)
+    assert [job.status for job in jobs] == [CREATED, FAILED]
+    assert doc.GetElement(shared.Id) is not None
+    assert "kept" in jobs[0].detail and jobs[0].replace_ids == []
+    # The old ceiling is removed in its own transaction, after the creation chunks
+    assert ("start", "Create ceilings (remove replaced)") not in doc.log
+
+
+def test_replaced_ceiling_is_deleted_after_creation(floor):
+    doc, _, ceiling_type, rooms, shared = floor
+    jobs = plan(doc, rooms[:2], ceiling_type, level_rooms=rooms)
+    create_ceilings(doc, jobs)
+    started = [name for event, name in doc.log if event == "start"]
+    assert started[-1] == "Create ceilings (remove replaced)"
+    assert doc.GetElement(shared.Id) is None
+
+
+def test_sketch_curves_are_chained_before_tessellating(floor):
+    doc, level, ceiling_type, rooms, shared = floor
+    # Same rectangle as R2, its curves out of order and one of them reversed
+    a, b, c, d = [XYZ(*p) for p in rectangle(20, 0, 30, 10)]
+    loop = CurveLoop([Line(c, d), Line(b, a), Line(b, c), Line(d, a)])
+    ceiling = Ceiling.Create(doc, [loop], ceiling_type.Id, level.Id)
+    rings = ceiling_rings(doc, ceiling)
+    assert len(rings[0]) == 4 and abs(polygon_area(rings[0])) == 100
+    jobs = plan(doc, rooms[2:], ceiling_type, replace=False)
+    assert jobs[0].status == COVERED and str(ceiling.Id) in jobs[0].detail
+
+
+def test_one_transaction_per_room_still_replaces_a_shared_ceiling(floor):
+    doc, _, ceiling_type, rooms, shared = floor
+    jobs = plan(doc, rooms, ceiling_type, level_rooms=rooms)
+    create_ceilings(doc, jobs, chunk_size=1)
+    assert [job.status for job in jobs] == [CREATED] * 3
+    assert doc.GetElement(shared.Id) is None
@@ -0,0 +1,176 @@
+"""Correctness fuzz of noaa.geometry against the original PointInPoly.
+
+Set NOAA_FUZZ_CASES to run more random polygon/point pairs (default 20000).
+"""
+
+import math
+import os
+import random
+
+import pytest
+
+from baseline_pip import PointInPoly
+from noaa import geometry
+from noaa.geometry import CompiledPolygon, PackedPolygons
+
+FUZZ_CASES = int(os.environ.get("NOAA_FUZZ_CASES", "20000"))
+POINTS_PER_POLYGON = 50
+TOLERANCE = 1e-6
+
+
+def star_polygon(rng, center=(0.0, 0.0), vertices=None, radius=(2.0, 20.0)):
+    """Random star-shaped (usually concave) polygon, CCW or CW."""
+    vertices = vertices or rng.randint(3, 40)
+    angles = sorted(rng.uniform(0, 2 * math.pi) for _ in range(vertices))
+    polygon = [(center[0] + r * math.cos(a), center[1] + r * math.sin(a), 0.0)
+               for a, r in ((a, rng.uniform(*radius)) for a in angles)]
+    if rng.random() < 0.5:
+        polygon.reverse()
+    return polygon
+
+
+def orthogonal_polygon(rng):
+    """Random rectilinear room outline (horizontal and vertical edges only), on a 0.5 ft grid."""
+    steps = rng.randint(2, 8)
+    xs = sorted(set(rng.randint(0, 40) * 0.5 for _ in range(steps + 1)))
+    if len(xs) < 2:
+        xs = [0.0, 5.0]
+    top = [(x, rng.randint(10, 40) * 0.5) for x in xs]
+    polygon = [(xs[0], 0.0, 0.0), (xs[-1], 0.0, 0.0)]
+    for k in range(len(top) - 1, -1, -1):
+        x, y = top[k]
+        polygon.append((x, y, 0.0))
+        if k:
+            polygon.append((top[k - 1][0], y, 0.0))
+    return polygon
+
+
+def probe_points(rng, polygon, count):
+    """Random points in the polygon's bbox, plus points on and just off its edges and vertices."""
+    min_x, min_y, max_x, max_y = geometry.polygon_bbox(polygon)
+    points = []
+    for _ in range(count):
+        kind = rng.random()
+        if kind < 0.6:
+            points.append((rng.uniform(min_x - 1, max_x + 1), rng.uniform(min_y - 1, max_y + 1), 0.0))
+            continue
+        a = polygon[rng.randrange(len(polygon))]
+        b = polygon[(polygon.index(a) + 1) % len(polygon)]
+        if kind < 0.8:
+            t = rng.random()
+            x, y = a[0] + t * (b[0] - a[0]), a[1] + t * (b[1] - a[1])
+        else:
+            x, y = a[0], a[1]
+        # On the edge, or clearly inside / outside the tolerance band
+        offset = rng.choice((0.0, 1e-3, -1e-3, 1e-9))
+        points.append((x + offset, y + offset, 0.0))
+    return points
+
+
+def baseline_contains(polygon, point):
+    return PointInPoly().polygon_contains(polygon, point, TOLERANCE)
+
+
+def random_cases(seed, cases):
+    rng = random.Random(seed)
+    done = 0
+    while done < cases:
+        polygon = orthogonal_polygon(rng) if rng.random() < 0.3 else star_polygon(rng)
+        points = probe_points(rng, polygon, min(POINTS_PER_POLYGON, cases - done))
+        done += len(points)
+        yield polygon, points
+
+
+@pytest.mark.parametrize("use_numpy", [False, pytest.param(True, marks=pytest.mark.skipif(
+    geometry.np is None, reason="numpy not installed"))])
+def test_packed_polygons_match_baseline(use_numpy):
+    mismatches = []
+    for polygon, points in random_cases(20240501, FUZZ_CASES):
+        packed = PackedPolygons([polygon], use_numpy=use_numpy)
+        for point, hits in zip(points, packed.locate(points, TOLERANCE)):
+            if bool(hits) != baseline_contains(polygon, point):
+                mismatches.append((polygon, point))
+    assert not mismatches, "{} mismatches, first: {}".format(len(mismatches), mismatches[0])
+
+
+def test_compiled_polygon_matches_baseline():
+    for polygon, points in random_cases(7, FUZZ_CASES // 4):
+        compiled = CompiledPolygon(polygon)
+        for point in points:
+            assert compiled.contains(point[0], point[1], TOLERANCE) == baseline_contains(polygon, point)
+
+
+def test_locate_returns_every_containing_id():
+    rng = random.Random(3)
+    polygons = [star_polygon(rng, center=(rng.uniform(0, 60), rng.uniform(0, 60))) for _ in range(30)]
+    ids = ["area-{}".format(k) for k in range(len(polygons))]
+    points = [(rng.uniform(-20, 80), rng.uniform(-20, 80)) for _ in range(2000)]
+    for use_numpy in (False, True):
+        packed = PackedPolygons(polygons, ids, use_numpy=use_numpy)
+        for point, hits in zip(points, packed.locate(points, TOLERANCE)):
+            expected = [key for key, polygon in zip(ids, polygons)
+                        if baseline_contains(polygon, (point[0], point[1], 0.0))]
+            assert sorted(hits) == sorted(expected)
+
+
+def test_contains_matrix_shape():
+    square = [(0, 0), (10, 0), (10, 10), (0, 10)]
+    shifted = [(5, 5), (15, 5), (15, 15), (5, 15)]
+    matrix = PackedPolygons([square, shifted], ids=[11, 22]).contains_matrix([(1, 1), (7, 7), (20, 20)])
+    assert matrix == [[True, False], [True, True], [False, False]]
+
+
+def test_polylabel_is_inside_and_far_from_walls():
+    rng = random.Random(11)
+    for _ in range(300):
+        ring = star_polygon(rng)
+        x, y, distance = geometry.polylabel([ring], precision=0.05)
+        assert distance > 0
+        assert abs(geometry.point_to_rings_distance(x, y, [ring]) - distance) < 1e-9
+        # No vertex of the ring is nearer than the reported distance
+        assert min(math.hypot(v[0] - x, v[1] - y) for v in ring) >= distance - 1e-9
+
+
+def test_polylabel_avoids_holes():
+    outer = [(0, 0), (30, 0), (30, 30), (0, 30)]
+    hole = [(10, 10), (10, 20), (20, 20), (20, 10)]
+    x, y, distance = geometry.polylabel([outer, hole], precision=0.01)
+    assert not (10 < x < 20 and 10 < y < 20)
+    # Best spots sit diagonally off the outer corners, equidistant from the walls and a hole corner
+    assert distance == pytest.approx(10 * math.sqrt(2) / (1 + math.sqrt(2)), abs=0.05)
+
+
+def full_scan_grid_points(rings, spacing, origin, limit=None):
+    """interior_grid_points as first written: every grid point over the bbox, then sorted."""
+    min_x, min_y, max_x, max_y = geometry.polygon_bbox(rings[0])
+    ox, oy = origin
+    points = []
+    for i in range(int(math.floor((min_x - ox) / spacing)), int(math.ceil((max_x - ox) / spacing)) + 1):
+        for j in range(int(math.floor((min_y - oy) / spacing)), int(math.ceil((max_y - oy) / spacing)) + 1):
+            x, y = ox + i * spacing, oy + j * spacing
+            if (i or j) and geometry.point_to_rings_distance(x, y, rings) > 0:
+                points.append((i * i + j * j, x, y))
+    points.sort()
+    return [(x, y) for _, x, y in points[:limit]]
+
+
+def test_interior_grid_points_match_full_scan():
+    rng = random.Random(5)
+    for _ in range(300):
+        ring = star_polygon(rng) if rng.random() < 0.7 else orthogonal_polygon(rng)
+        min_x, min_y, max_x, max_y = geometry.polygon_bbox(ring)
+        # Origins inside, near and outside the room
+        origin = (rng.uniform(min_x - 5, max_x + 5), rng.uniform(min_y - 5, max_y + 5))
+        spacing = rng.uniform(0.3, 3.0)
+        limit = rng.choice((None, 1, 5, 40))
+        assert geometry.interior_grid_points([ring], spacing, origin, limit) == \
+            full_scan_grid_points([ring], spacing, origin, limit)
+
+
+def test_interior_grid_points_stop_near_the_origin(monkeypatch):
+    room = [[(0, 0), (1000, 0), (1000, 1000), (0, 1000)]]
+    calls = []
+    distance = geometry.point_to_rings_distance
+    monkeypatch.setattr(geometry, "point_to_rings_distance", lambda x, y, rings: calls.append(1) or distance(x, y, rings))
+    points = geometry.interior_grid_points(room, 1.0, (500, 500), 8)
+    assert len(points) == 8 and len(calls) < 50
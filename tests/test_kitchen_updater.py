@@ -0,0 +1,215 @@
+"""Kitchen Type kept current by update_kitchen_types in group and area mode, settings and linked kitchens."""
+
+import pytest
+
+import revit_standin
+from revit_standin import (Area, DataStorage, Document, FamilyInstance, Group, GroupType, Level, RevitLinkInstance,
+                           UpdaterData, rectangle)
+
+revit_standin.install()
+
+from noaa.kitchen_updater import KitchenTypeUpdater, register_kitchen_updater, update_kitchen_types  # noqa: E402
+from noaa.kitchens import (KITCHEN_TYPE_PARAMETER, MATCH_BY_AREAS, MATCH_BY_GROUPS, load_kitchen_settings,  # noqa: E402
+                           resolve_kitchen_types, save_kitchen_settings)
+
+SINK = "Sink - Kitchen"
+OTHER = "Sink - Utility"
+
+
+def square(x, y, size=10.0):
+    return [rectangle(x, y, x + size, y + size)]
+
+
+def kitchen_type(area):
+    return area.LookupParameter(KITCHEN_TYPE_PARAMETER).AsString()
+
+
+@pytest.fixture
+def model():
+    """Two apartments side by side on level 1, one on level 2, and a sink in the first one."""
+    doc = Document()
+    level_1 = doc.add(Level("Level 1", 0.0))
+    level_2 = doc.add(Level("Level 2", 10.0))
+    apartments = [
+        doc.add(Area("W1-01-01", level_1.Id, square(0, 0), {KITCHEN_TYPE_PARAMETER: ""})),
+        doc.add(Area("W1-01-02", level_1.Id, square(10, 0), {KITCHEN_TYPE_PARAMETER: ""})),
+        doc.add(Area("W1-02-01", level_2.Id, square(0, 0), {KITCHEN_TYPE_PARAMETER: ""})),
+    ]
+    sink = doc.add(FamilyInstance(SINK, level_1.Id, 5, 5))
+    return doc, (level_1, level_2), apartments, sink
+
+
+def update(doc, fixture_levels, changed=(), deleted=(), names=(SINK,), mode=MATCH_BY_AREAS):
+    return update_kitchen_types(doc, [e.Id for e in changed], [e.Id for e in deleted], list(names), mode,
+                                fixture_levels)
+
+
+def test_added_fixture_marks_its_apartment(model):
+    doc, _, (first, second, upstairs), sink = model
+    assert update(doc, {}, changed=[sink]) == 1
+    assert (kitchen_type(first), kitchen_type(second), kitchen_type(upstairs)) == (SINK, "", "")
+
+
+def test_line_based_fixture_is_skipped(model):
+    doc, (level_1, _), (first, second, _), sink = model
+    trough = doc.add(FamilyInstance(SINK, level_1.Id, 15, 5))
+    trough.Location = revit_standin.LocationCurve(revit_standin.Line(revit_standin.XYZ(12, 5), revit_standin.XYZ(18, 5)))
+    assert update(doc, {}, changed=[sink, trough]) == 1
+    assert (kitchen_type(first), kitchen_type(second)) == (SINK, "")
+
+
+def test_moved_fixture_follows_to_the_next_apartment(model):
+    doc, _, (first, second, _), sink = model
+    fixture_levels = {}
+    update(doc, fixture_levels, changed=[sink])
+    sink.move_to(15, 5)
+    assert update(doc, fixture_levels, changed=[sink]) == 2
+    assert (kitchen_type(first), kitchen_type(second)) == ("", SINK)
+
+
+def test_fixture_moved_to_another_level_clears_the_old_one(model):
+    doc, (_, level_2), (first, _, upstairs), sink = model
+    fixture_levels = {}
+    update(doc, fixture_levels, changed=[sink])
+    sink.move_to(5, 5, level_2.Id)
+    update(doc, fixture_levels, changed=[sink])
+    assert (kitchen_type(first), kitchen_type(upstairs)) == ("", SINK)
+
+
+def test_deleted_fixture_clears_its_apartment(model):
+    doc, _, (first, _, _), sink = model
+    fixture_levels = {}
+    update(doc, fixture_levels, changed=[sink])
+    doc.Delete(sink.Id)
+    assert update(doc, fixture_levels, deleted=[sink]) == 1
+    assert kitchen_type(first) == ""
+
+
+def test_values_not_written_by_the_tool_are_kept(model):
+    doc, _, (first, second, _), sink = model
+    second.LookupParameter(KITCHEN_TYPE_PARAMETER).Set("Custom")
+    update(doc, {}, changed=[sink])
+    assert (kitchen_type(first), kitchen_type(second)) == (SINK, "Custom")
+
+
+def test_last_configured_name_wins(model):
+    doc, (level_1, _), (first, _, _), sink = model
+    utility = doc.add(FamilyInstance(OTHER, level_1.Id, 2, 2))
+    update(doc, {}, changed=[sink, utility], names=(SINK, OTHER))
+    assert kitchen_type(first) == OTHER
+
+
+def test_area_without_boundary_is_skipped_quietly(model, capsys):
+    doc, (level_1, _), (first, _, _), sink = model
+    doc.add(Area("W1-01-03", level_1.Id, [], {KITCHEN_TYPE_PARAMETER: ""}))
+    update(doc, {}, changed=[sink])
+    assert kitchen_type(first) == SINK
+    assert capsys.readouterr().out == ""
+
+
+def test_group_mode_marks_every_instance_of_the_group_type(model):
+    doc, (level_1, level_2), (first, _, upstairs), sink = model
+    group_type = doc.add(GroupType("Apartment A"))
+    doc.add(Group(group_type, [first, sink]))
+    doc.add(Group(group_type, [upstairs]))
+    update(doc, {}, changed=[sink], mode=MATCH_BY_GROUPS)
+    assert (kitchen_type(first), kitchen_type(upstairs)) == (SINK, SINK)
+
+
+def test_resolve_returns_its_diagnostics(model, capsys):
+    doc, (level_1, _), (first, _, _), _ = model
+    unenclosed = doc.add(Area("W1-01-03", level_1.Id, [], {KITCHEN_TYPE_PARAMETER: ""}))
+    link = linked_kitchen(doc, loaded=False)
+    missing, unloaded = [], []
+    kitchen_types, _, _ = resolve_kitchen_types(doc, [SINK], MATCH_BY_AREAS, link_instances=[link],
+                                                missing=missing, unloaded=unloaded)
+    assert kitchen_types == {first.Id.IntegerValue: SINK}
+    assert (missing, unloaded) == ([unenclosed.Id.IntegerValue], ["Kitchens.rvt"])
+    assert capsys.readouterr().out == ""
+
+
+def test_settings_are_stored_in_the_model(model):
+    doc = model[0]
+    assert load_kitchen_settings(doc) == ([], None, [])
+    save_kitchen_settings(doc, [SINK, OTHER], MATCH_BY_AREAS)
+    assert load_kitchen_settings(doc) == ([SINK, OTHER], MATCH_BY_AREAS, [])
+    assert load_kitchen_settings(Document()) == ([], None, [])
+    # On one DataStorage element of their own, updated in place; Project Information is left alone
+    save_kitchen_settings(doc, [SINK], MATCH_BY_GROUPS)
+    storages = [e for e in doc.elements.values() if isinstance(e, DataStorage)]
+    assert len(storages) == 1 and not doc.ProjectInformation._entities
+    assert load_kitchen_settings(doc) == ([SINK], MATCH_BY_GROUPS, [])
+
+
+def linked_kitchen(doc, offset=(100.0, 0.0, 0.0), loaded=True):
+    """A link holding one sink, placed so the sink lands in the host's second apartment."""
+    link_doc = Document()
+    link_level = link_doc.add(Level("Level 1", 0.0))
+    link_doc.add(FamilyInstance(SINK, link_level.Id, 15 - offset[0], 5 - offset[1]))
+    return doc.add(RevitLinkInstance("Kitchens.rvt", link_doc if loaded else None, offset))
+
+
+def test_links_are_stored_with_the_settings(model):
+    doc = model[0]
+    link = linked_kitchen(doc)
+    save_kitchen_settings(doc, [SINK], MATCH_BY_AREAS, [link])
+    assert load_kitchen_settings(doc) == ([SINK], MATCH_BY_AREAS, [link])
+    doc.Delete(link.Id)
+    assert load_kitchen_settings(doc) == ([SINK], MATCH_BY_AREAS, [])
+
+
+def test_host_change_keeps_linked_kitchens(model):
+    doc, _, (first, second, _), sink = model
+    link = linked_kitchen(doc)
+    second.LookupParameter(KITCHEN_TYPE_PARAMETER).Set(SINK)    # as left by the button
+    save_kitchen_settings(doc, [SINK], MATCH_BY_AREAS, [link])
+    KitchenTypeUpdater("addin").Execute(UpdaterData(doc, modified=[sink]))
+    assert (kitchen_type(first), kitchen_type(second)) == (SINK, SINK)
+
+
+def test_unloaded_link_clears_nothing(model):
+    doc, _, (first, second, _), sink = model
+    link = linked_kitchen(doc, loaded=False)
+    first.LookupParameter(KITCHEN_TYPE_PARAMETER).Set(SINK)
+    second.LookupParameter(KITCHEN_TYPE_PARAMETER).Set(SINK)
+    save_kitchen_settings(doc, [SINK], MATCH_BY_AREAS, [link])
+    doc.Delete(sink.Id)
+    KitchenTypeUpdater("addin").Execute(UpdaterData(doc, deleted=[sink]))
+    assert (kitchen_type(first), kitchen_type(second)) == (SINK, SINK)
+
+
+def test_updater_does_nothing_without_settings(model):
+    doc, _, (first, _, _), sink = model
+    KitchenTypeUpdater("addin").Execute(UpdaterData(doc, added=[sink]))
+    assert kitchen_type(first) == ""
+
+
+def test_updater_first_run_catches_a_deletion_it_never_saw(model):
+    doc, _, (first, _, _), sink = model
+    first.LookupParameter(KITCHEN_TYPE_PARAMETER).Set(SINK)    # as left by the button
+    save_kitchen_settings(doc, [SINK], MATCH_BY_AREAS)
+    updater = KitchenTypeUpdater("addin")
+    doc.Delete(sink.Id)
+    updater.Execute(UpdaterData(doc, deleted=[sink]))
+    assert kitchen_type(first) == ""
+
+
+def test_updater_seeds_fixture_levels_once_per_document(model):
+    doc, (level_1, _), (first, second, _), sink = model
+    save_kitchen_settings(doc, [SINK], MATCH_BY_AREAS)
+    updater = KitchenTypeUpdater("addin")
+    updater.Execute(UpdaterData(doc, added=[sink]))
+    second_sink = doc.add(FamilyInstance(SINK, level_1.Id, 15, 5))
+    updater.Execute(UpdaterData(doc, added=[second_sink]))
+    assert (kitchen_type(first), kitchen_type(second)) == (SINK, SINK)
+    doc.Delete(second_sink.Id)
+    updater.Execute(UpdaterData(doc, deleted=[second_sink]))
+    assert (kitchen_type(first), kitchen_type(second)) == (SINK, "")
+
+
+def test_register_once():
+    revit_standin.UpdaterRegistry.reset()
+    first = register_kitchen_updater("addin")
+    triggers = len(revit_standin.UpdaterRegistry.triggers)
+    assert register_kitchen_updater("addin") == first
+    assert len(revit_standin.UpdaterRegistry.triggers) == triggers > 0
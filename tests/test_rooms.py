@@ -0,0 +1,69 @@
+"""Centring and de-overlapping room tags (noaa.rooms) over repeated runs."""
+
+import pytest
+
+import revit_standin
+from revit_standin import Document, Level, Room, RoomTag, rectangle
+
+revit_standin.install()
+
+from noaa.boundaries import get_boundary_cache  # noqa: E402
+from noaa.rooms import MoveReport, RoomLabelPoints, deoverlapped_tags  # noqa: E402
+
+VIEW = None
+
+
+@pytest.fixture
+def plan():
+    """Two narrow rooms side by side: their tags overlap once both are centred."""
+    doc = Document()
+    level = doc.add(Level("Level 1"))
+    rooms = [doc.add(Room("R{}".format(k), level.Id, [rectangle(3 * k, 0, 3 * k + 3, 20)])) for k in range(2)]
+    tags = [doc.add(RoomTag(room, 3 * k + 1, 2)) for k, room in enumerate(rooms)]
+    return doc, tags
+
+
+def centre_tags(doc, tags, keep_settled=True):
+    """What CenterRoomTags does with DEOVERLAP on, inside one transaction."""
+    cache = get_boundary_cache(doc)
+    label_points = RoomLabelPoints(cache)
+    report = MoveReport()
+    targets = dict((tag.Id.IntegerValue, label_points.get(tag.Room)) for tag in tags)
+    settled = deoverlapped_tags(VIEW, tags, targets, cache) if keep_settled else set()
+    for tag in tags:
+        report.move(tag, tag.Room, targets[tag.Id.IntegerValue], move_tag=tag.Id.IntegerValue not in settled)
+    report.separate(VIEW, tags, cache)
+    return report
+
+
+def positions(tags):
+    return [(tag.Location.Point.X, tag.Location.Point.Y) for tag in tags]
+
+
+def test_rerun_leaves_nudged_tags_where_they_are(plan):
+    doc, tags = plan
+    first = centre_tags(doc, tags)
+    assert (first.moved, first.nudged, first.overlapping) == (2, 1, 0)
+    placed = positions(tags)
+    again = centre_tags(doc, tags)
+    assert (again.moved, again.nudged, again.overlapping) == (0, 0, 0)
+    assert positions(tags) == placed
+
+
+def test_without_settling_a_rerun_moves_the_nudged_tag_twice(plan):
+    doc, tags = plan
+    centre_tags(doc, tags)
+    again = centre_tags(doc, tags, keep_settled=False)
+    assert (again.moved, again.nudged) == (1, 1)
+
+
+def test_overlapping_off_centre_tag_is_centred_again(plan):
+    doc, tags = plan
+    centre_tags(doc, tags)
+    cache = get_boundary_cache(doc)
+    targets = dict((tag.Id.IntegerValue, RoomLabelPoints(cache).get(tag.Room)) for tag in tags)
+    nudged, other = sorted(tags, key=lambda tag: -tag.Location.Point.DistanceTo(targets[tag.Id.IntegerValue]))
+    assert deoverlapped_tags(VIEW, tags, targets, cache) == set([nudged.Id.IntegerValue])
+    # Moved by hand onto the other tag: no longer settled
+    nudged.Location.Point = revit_standin.XYZ(nudged.Location.Point.X + 1, other.Location.Point.Y + 0.5)
+    assert deoverlapped_tags(VIEW, tags, targets, cache) == set()